@@ -3,57 +3,50 @@ import hashlib
 import logging
 from datetime import datetime, timedelta
 from flask import Flask, request
-from flask_sqlalchemy import SQLAlchemy
-from telegram import Update, Bot
+from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, CallbackContext
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 from utils.config import Config
 from utils.content_filter import classify_content
 from utils.duplicate_checker import is_duplicate
+from app.database import db, GlobalImpact, GroupSettings
+from app.market_aggregates import market_aggregator
+from app.market_data import SaudiMarketData
+from app.templating import templates, Raw
+from app.islamic_content import islamic_content
+from app.subscriptions import subscriptions
+from app.stock_index import stock_index
+from app.outbox import outbox, run_sync
+from app.retention import retention
+from app.scan_executor import ParallelScanExecutor
+from app.strategies import TradingStrategies, GoalTracker
+from app.write_behind import write_behind
+from app.notifications import NotificationManager
 import asyncio
+import atexit
 import re
 
 # تعريف لوحة التحكم
 app = Flask(__name__)
 app.config.from_object(Config)
 
-# تهيئة قاعدة البيانات
-db = SQLAlchemy()
+# تهيئة قاعدة البيانات: نسخة واحدة ونماذج واحدة تشترك فيها جميع الوحدات
 db.init_app(app)
 
-# تعريف النماذج
-class ContentRegistry(db.Model):
-    __tablename__ = 'content_registry'
-    id = db.Column(db.Integer, primary_key=True)
-    content_hash = db.Column(db.String(64), unique=True, nullable=False)
-    content_type = db.Column(db.String(50))
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    symbol = db.Column(db.String(10))
-
-class GlobalImpact(db.Model):
-    __tablename__ = 'global_impact'
-    id = db.Column(db.Integer, primary_key=True)
-    event_description = db.Column(db.Text)
-    severity = db.Column(db.String(20))
-    detected_at = db.Column(db.DateTime, default=datetime.utcnow)
-
-class GroupSettings(db.Model):
-    __tablename__ = 'group_settings'
-    id = db.Column(db.Integer, primary_key=True)
-    chat_id = db.Column(db.String(50), unique=True)
-    daily_summary = db.Column(db.Boolean, default=True)
-    stock_analysis = db.Column(db.Boolean, default=True)
-    global_events = db.Column(db.Boolean, default=True)
-    azkar = db.Column(db.Boolean, default=True)
-    remove_phone_numbers = db.Column(db.Boolean, default=True)
-    remove_urls = db.Column(db.Boolean, default=True)
-
 # تعريف كلاس SaudiStockBot
 class SaudiStockBot:
     def __init__(self):
         self.application = ApplicationBuilder().token(Config.TELEGRAM_TOKEN).build()
         self.scheduler = BackgroundScheduler(daemon=True)
+        self.market_data = SaudiMarketData()
+        self.strategies = TradingStrategies()
+        self.notifier = NotificationManager()
+        self.goal_tracker = GoalTracker(self.strategies, self._current_price)
+        self.scan_executor = ParallelScanExecutor()
+        write_behind.start(app)
+        self._load_subscriptions()
+        self._load_stock_index()
         self._setup_handlers()
         self._schedule_jobs()
         asyncio.run(self._init_webhook())
@@ -62,11 +55,22 @@ class SaudiStockBot:
         handlers = [
             CommandHandler("start", self._handle_start),
             MessageHandler(filters.TEXT & filters.ChatType.GROUPS, self._handle_group_message),
-            CommandHandler("settings", self._handle_settings)
+            CommandHandler("settings", self._handle_settings),
+            CommandHandler("approve", self._handle_approve)
         ]
         self.application.add_handlers(handlers)
 
     def _schedule_jobs(self):
+        # لقطة السوق تُحسب مرة واحدة لكل شمعة وتقرأها التقارير والتنبيهات
+        self.scheduler.add_job(
+            self._refresh_market_snapshot,
+            trigger=CronTrigger(
+                day_of_week='sun-thu',
+                hour='10-15',
+                minute='*/5',
+                timezone=Config.MARKET_TIMEZONE
+            )
+        )
         self.scheduler.add_job(
             self._send_market_summary,
             trigger=CronTrigger(
@@ -80,6 +84,43 @@ class SaudiStockBot:
             trigger='interval',
             hours=2
         )
+        self.scheduler.add_job(
+            self._sweep_subscriptions,
+            trigger=CronTrigger(
+                hour=9,
+                minute=0,
+                timezone=Config.MARKET_TIMEZONE
+            )
+        )
+        # متابعة أهداف الفرص المفتوحة خلال التداول
+        self.scheduler.add_job(
+            self._track_goals,
+            trigger=CronTrigger(
+                day_of_week='sun-thu',
+                hour='10-15',
+                minute='*/15',
+                timezone=Config.MARKET_TIMEZONE
+            )
+        )
+        # مسح الاستراتيجيات لكامل السوق بعد الإغلاق
+        self.scheduler.add_job(
+            self._scan_market,
+            trigger=CronTrigger(
+                day_of_week='sun-thu',
+                hour=15,
+                minute=30,
+                timezone=Config.MARKET_TIMEZONE
+            )
+        )
+        # تنظيف الجداول خارج أوقات التداول
+        self.scheduler.add_job(
+            self._run_retention,
+            trigger=CronTrigger(
+                hour=2,
+                minute=30,
+                timezone=Config.MARKET_TIMEZONE
+            )
+        )
         self.scheduler.add_job(
             self._send_azkar,
             trigger=CronTrigger(
@@ -90,17 +131,28 @@ class SaudiStockBot:
         )
         self.scheduler.start()
 
+    def _load_subscriptions(self):
+        with app.app_context():
+            try:
+                count = subscriptions.load()
+                logging.info(f"Loaded {count} active groups")
+            except Exception as e:
+                logging.error(f"Subscription load error: {str(e)}")
+
+    def _load_stock_index(self):
+        with app.app_context():
+            try:
+                self.market_data.refresh_stock_index()
+            except Exception as e:
+                logging.error(f"Stock index load error: {str(e)}")
+
     async def _init_webhook(self):
         webhook_url = f"https://{os.getenv('HEROKU_APP_NAME')}.herokuapp.com/webhook"
         await self.application.bot.set_webhook(webhook_url)
 
     # Command Handlers
     def _handle_start(self, update: Update, context: CallbackContext):
-        welcome_msg = """📈 *مرحبًا بكم في بوت الأسهم السعودية الذكي* 
-        
-استخدم الأوامر التالية:
-- /settings : ضبط إعدادات المجموعة
-- رمز السهم (مثل: 2222) : الحصول على التحليل الفني"""
+        welcome_msg = templates.render_shared('welcome.md')
         context.bot.send_message(
             chat_id=update.effective_chat.id,
             text=welcome_msg,
@@ -109,28 +161,65 @@ class SaudiStockBot:
 
     def _handle_settings(self, update: Update, context: CallbackContext):
         settings = self._get_group_settings(update.effective_chat.id)
-        settings_menu = f"""⚙️ *إعدادات البوت*
-        
-1. التنبيهات اليومية: {'✅' if settings.daily_summary else '❌'}
-2. التحليل الفني: {'✅' if settings.stock_analysis else '❌'}
-3. الأحداث العالمية: {'✅' if settings.global_events else '❌'}
-4. الأذكار: {'✅' if settings.azkar else '❌'}
-5. حذف أرقام الهواتف: {'✅' if settings.remove_phone_numbers else '❌'}
-6. حذف المواقع: {'✅' if settings.remove_urls else '❌'}
-
-استخدم /set<رقم> on/off لتغيير الإعداد (مثال: /set1 off)"""
+        flags = {
+            name: '✅' if value else '❌'
+            for name, value in (
+                ('daily_summary', settings.reports_enabled),
+                ('stock_analysis', settings.stock_analysis),
+                ('global_events', settings.receive_global),
+                ('azkar', settings.azkar),
+                ('remove_phone_numbers', settings.remove_phone_numbers),
+                ('remove_urls', settings.remove_urls)
+            )
+        }
+        settings_menu = templates.render_shared(
+            'settings.md',
+            market_preview=self._market_preview(),
+            **flags
+        )
         update.message.reply_text(settings_menu, parse_mode='Markdown')
 
+    def _market_preview(self) -> str:
+        snapshot = market_aggregator.snapshot
+        if snapshot is None:
+            return Raw("")
+        return templates.render_shared(
+            'market_preview.md',
+            index_change=snapshot.index_change,
+            advancers=snapshot.advancers,
+            decliners=snapshot.decliners
+        )
+
     def _get_group_settings(self, chat_id):
         with app.app_context():
-            settings = GroupSettings.query.filter_by(chat_id=str(chat_id)).first()
+            settings = db.session.get(GroupSettings, str(chat_id))
             if not settings:
                 settings = GroupSettings(chat_id=str(chat_id))
                 db.session.add(settings)
                 db.session.commit()
+                # تحميل القيم الافتراضية قبل إغلاق الجلسة حتى تبقى قابلة للقراءة
+                db.session.refresh(settings)
             return settings
 
+    def _handle_approve(self, update: Update, context: CallbackContext):
+        if update.effective_user.id not in Config.ADMIN_IDS:
+            return
+        if not context.args:
+            update.message.reply_text("استخدم: /approve <chat_id> [عدد الأيام]")
+            return
+        days = int(context.args[1]) if len(context.args) > 1 and context.args[1].isdigit() else None
+        with app.app_context():
+            end = subscriptions.approve(context.args[0], days)
+        update.message.reply_text(f"✅ تم تفعيل المجموعة حتى {end.strftime('%Y-%m-%d')}")
+
     def _handle_group_message(self, update: Update, context: CallbackContext):
+        # رسائل المجموعات غير المفعلة تُتجاهل قبل أي معالجة أخرى
+        chat = update.effective_chat
+        if not self._is_group_active(chat.id):
+            self._handle_inactive_group(update, context)
+            return
+        write_behind.record_activity(chat.id)
+
         msg_text = update.message.text.strip()
         settings = self._get_group_settings(update.effective_chat.id)
         
@@ -139,24 +228,62 @@ class SaudiStockBot:
         if settings.remove_urls:
             msg_text = re.sub(r'http\S+', '[رابط محذوف]', msg_text)
         
-        if self._is_valid_stock_symbol(msg_text) and settings.stock_analysis:
-            self._process_stock_request(update, msg_text)
-        elif settings.global_events:
+        symbol = self._detect_stock_symbol(msg_text) if settings.stock_analysis else None
+        if symbol:
+            self._process_stock_request(update, symbol)
+        elif settings.receive_global:
             content_type = classify_content(msg_text)
             if content_type == 'global_event':
                 self._process_global_event(update, msg_text)
 
-    def _is_valid_stock_symbol(self, text: str) -> bool:
-        return text.isdigit() and 1000 <= int(text) <= 9999
+    def _is_group_active(self, chat_id) -> bool:
+        with app.app_context():
+            try:
+                return subscriptions.is_active(chat_id)
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Subscription check error for {chat_id}: {str(e)}")
+                return False
+
+    def _handle_inactive_group(self, update: Update, context: CallbackContext):
+        chat = update.effective_chat
+        with app.app_context():
+            try:
+                is_new = subscriptions.register_pending(
+                    chat.id,
+                    title=chat.title,
+                    admin_username=update.effective_user.username if update.effective_user else None
+                )
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Pending group registration error for {chat.id}: {str(e)}")
+                return
+        if is_new:
+            context.bot.send_message(
+                chat_id=chat.id,
+                text=NotificationManager.group_activation_message(),
+                parse_mode='Markdown'
+            )
+
+    def _detect_stock_symbol(self, text: str):
+        # رمز أو اسم السهم كرسالة كاملة، وإلا أول سهم مذكور داخل الرسالة
+        # المطابقة التقريبية للرسائل القصيرة فقط لتفادي الإيجابيات الكاذبة
+        symbol = stock_index.resolve(text, fuzzy=len(text.split()) <= 2)
+        if symbol:
+            return symbol
+        mentions = stock_index.find_mentions(text)
+        return mentions[0] if mentions else None
 
     def _process_stock_request(self, update: Update, symbol: str):
         content_hash = hashlib.sha256(symbol.encode()).hexdigest()
         
-        if is_duplicate(content_hash):
-            update.message.reply_text("⏳ هذا السهم قيد التحليل بالفعل")
-            return
-
         try:
+            with app.app_context():
+                duplicate = is_duplicate(content_hash)
+            if duplicate:
+                update.message.reply_text("⏳ هذا السهم قيد التحليل بالفعل")
+                return
+
             # Simulated stock data - Replace with real API call
             stock_data = {
                 'symbol': symbol,
@@ -164,111 +291,216 @@ class SaudiStockBot:
                 'change': +2.3,
                 'analysis': "اتجاه صاعد مع دعم قوي عند 145"
             }
+            snapshot = market_aggregator.snapshot
+            if snapshot is not None and snapshot.change_for(symbol) is not None:
+                stock_data['price'] = round(snapshot.price_for(symbol), 2)
+                stock_data['change'] = snapshot.change_for(symbol)
             
-            response_msg = f"""
-📊 *تحليل سهم {symbol}*
+            response_msg = templates.render('stock_analysis.md', **stock_data)
             
-السعر الحالي: {stock_data['price']} ريال
-التغيير: {stock_data['change']}%
-التحليل الفني: {stock_data['analysis']}
-            """
-            
-            update.message.reply_text(response_msg.strip(), parse_mode='Markdown')
-            self._register_content(content_hash, 'stock_analysis', symbol)
+            update.message.reply_text(response_msg, parse_mode='Markdown')
+            self._register_content(content_hash, 'stock_analysis', update)
             
         except Exception as e:
             logging.error(f"Stock processing error: {str(e)}")
             update.message.reply_text("⚠️ حدث خطأ في معالجة الطلب")
 
-    def _register_content(self, content_hash: str, content_type: str, symbol: str = None):
+    def _register_content(self, content_hash: str, content_type: str, update: Update):
+        # تُسجل في الذاكرة وتُكتب لاحقاً على دفعات، فلا ينتظر الرد أي commit
+        write_behind.record_content(content_hash, content_type, chat_id=update.effective_chat.id)
+        if update.effective_user:
+            write_behind.record_usage(update.effective_user.id)
+
+    # Scheduled Tasks
+    def _refresh_market_snapshot(self):
+        with app.app_context():
+            try:
+                self.market_data.refresh_market_snapshot()
+            except Exception as e:
+                logging.error(f"Market snapshot error: {str(e)}")
+
+    def _current_price(self, symbol):
+        # أسعار التنبيهات من لقطة السوق المحدثة لكل شمعة، وطلب مباشر فقط للأسهم غير الموجودة فيها
+        snapshot = market_aggregator.snapshot
+        price = snapshot.price_for(symbol) if snapshot is not None else None
+        return price if price is not None else self.market_data.get_current_price(symbol)
+
+    def _send_text(self, chat_id, text):
+        # Bot غير متزامن: يُنفذ الإرسال عبر حلقة الأحداث المشتركة وتُرفع أخطاؤه للمستدعي
+        run_sync(outbox.bot.send_message(chat_id=chat_id, text=text, parse_mode='Markdown'))
+
+    def _sweep_subscriptions(self):
         with app.app_context():
-            new_entry = ContentRegistry(
-                content_hash=content_hash,
-                content_type=content_type,
-                symbol=symbol
+            try:
+                # الإرسال متزامن حتى اكتماله، فلا يُسجل last_reminder إلا لتذكير وصل فعلاً
+                result = subscriptions.sweep(self._send_text)
+                logging.info(f"Subscription sweep: {result}")
+            except Exception as e:
+                logging.error(f"Subscription sweep error: {str(e)}")
+
+    def _scan_market(self):
+        with app.app_context():
+            try:
+                frames = self.market_data.get_market_frames(stock_index.symbols())
+                signals = self.scan_executor.scan(self.strategies, frames)
+                # كل مجموعة تتابع فرصها بنفسها وتستلم فقط ما ليس لها فرصة مفتوحة فيه؛
+                # نص الإشارة يُنسق مرة واحدة للجميع
+                new = self.strategies.save_signals(signals, chat_ids=self._alert_chats())
+                messages = {}
+                for chat_id, chat_signals in new.items():
+                    for signal in chat_signals:
+                        key = (signal['symbol'], signal['strategy'])
+                        if key not in messages:
+                            messages[key] = self._format_signal(signal)
+                        self.notifier.send_signal(chat_id, messages[key])
+                logging.info(
+                    f"Market scan: {len(frames)} symbols, {len(signals)} signals, "
+                    f"{sum(map(len, new.values()))} new alerts for {len(new)} groups"
+                )
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Market scan error: {str(e)}")
+
+    def _alert_chats(self):
+        # المجموعات المفعلة التي لم توقف التنبيهات
+        chats = subscriptions.active_chats()
+        muted = {
+            chat_id for (chat_id,) in db.session.query(GroupSettings.chat_id).filter(
+                GroupSettings.chat_id.in_(chats),
+                GroupSettings.receive_alerts.is_(False)
             )
-            db.session.add(new_entry)
-            db.session.commit()
+        }
+        return [chat_id for chat_id in chats if chat_id not in muted]
+
+    def _format_signal(self, signal):
+        entry = stock_index.get(signal['symbol'])
+        targets = signal['targets']
+        return templates.render(
+            'signal.md',
+            strategy=self.strategies.strategies[signal['strategy']].name,
+            stock_name=entry.name if entry else signal['symbol'],
+            symbol=signal['symbol'],
+            entry_price=signal['entry_price'],
+            target1=targets['1'],
+            target2=targets['2'],
+            target3=targets['3']
+        )
+
+    def _track_goals(self):
+        with app.app_context():
+            try:
+                self.goal_tracker.track_goals()
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Goal tracking error: {str(e)}")
+
+    def _run_retention(self):
+        with app.app_context():
+            try:
+                retention.run()
+            except Exception as e:
+                logging.error(f"Retention error: {str(e)}")
 
-    # Scheduled Tasks
     def _send_market_summary(self):
         with app.app_context():
-            groups = GroupSettings.query.filter_by(daily_summary=True).all()
+            groups = GroupSettings.query.filter_by(reports_enabled=True).all()
+            # التقرير واحد لجميع المجموعات
+            report = self._generate_daily_report()
             for group in groups:
                 try:
-                    report = self._generate_daily_report()
-                    Bot(token=Config.TELEGRAM_TOKEN).send_message(
-                        chat_id=group.chat_id,
-                        text=report,
-                        parse_mode='Markdown'
-                    )
+                    self._send_text(group.chat_id, report)
                 except Exception as e:
                     logging.error(f"Summary error for {group.chat_id}: {str(e)}")
 
     def _generate_daily_report(self) -> str:
-        return """
-📨 *التقرير اليومي للسوق*
-        
-1. مؤشر تداول: +1.5%
-2. أعلى ارتفاع: سهم 2222 (+5.2%)
-3. أهم الأخبار: إعلان أرباح شركة أرامكو
-        """
+        snapshot = market_aggregator.snapshot
+        if snapshot is None:
+            return "📨 *التقرير اليومي للسوق*\n\nلا تتوفر بيانات السوق حالياً."
+
+        def _movers(movers):
+            if not movers:
+                return Raw("- لا يوجد")
+            return templates.render_many('report_mover.md', [vars(m) for m in movers])
+
+        # اللقطة ثابتة حتى الشمعة التالية، لذا يُعاد استخدام التقرير المنسق
+        return templates.render_shared(
+            'reports.md',
+            date=snapshot.as_of.strftime('%Y-%m-%d'),
+            index=f"{snapshot.index_change:+.2f}%",
+            gainers=_movers(snapshot.gainers),
+            losers=_movers(snapshot.losers)
+        )
 
     def _monitor_global_events(self):
         with app.app_context():
-            groups = GroupSettings.query.filter_by(global_events=True).all()
+            groups = GroupSettings.query.filter_by(receive_global=True).all()
             events = GlobalImpact.query.filter(
-                GlobalImpact.detected_at >= datetime.utcnow() - timedelta(hours=6)
+                GlobalImpact.timestamp >= datetime.now() - timedelta(hours=6)
             ).all()
             
             for event in events:
                 self._broadcast_event(event, groups)
 
     def _broadcast_event(self, event: GlobalImpact, groups):
-        event_msg = f"""
-🌍 *حدث عالمي مؤثر*
-        
-{event.event_description}
-        
-المستوى: {event.severity}
-        """
-        
+        event_msg = templates.render_shared(
+            'global_event.md',
+            description=event.description or event.event_type,
+            severity=event.impact_level
+        )
+
         for group in groups:
             try:
-                Bot(token=Config.TELEGRAM_TOKEN).send_message(
-                    chat_id=group.chat_id,
-                    text=event_msg.strip(),
-                    parse_mode='Markdown'
-                )
+                self._send_text(group.chat_id, event_msg)
             except Exception as e:
                 logging.error(f"Event broadcast error for {group.chat_id}: {str(e)}")
 
     def _send_azkar(self):
+        # فحص واحد للملف لكل بث، ثم الاختيار من الذاكرة لكل مجموعة
+        islamic_content.refresh()
         with app.app_context():
             groups = GroupSettings.query.filter_by(azkar=True).all()
             for group in groups:
                 try:
-                    azkar = self._get_azkar()
-                    Bot(token=Config.TELEGRAM_TOKEN).send_message(
-                        chat_id=group.chat_id,
-                        text=azkar,
-                        parse_mode='Markdown'
-                    )
+                    islamic_content.restore(group.chat_id, group.azkar_state)
+                    azkar = self._get_azkar(group.chat_id)
+                    group.azkar_state = islamic_content.state(group.chat_id)
+                    self._send_text(group.chat_id, azkar)
                 except Exception as e:
                     logging.error(f"Azkar sending error for {group.chat_id}: {str(e)}")
+            # حفظ حالة التدوير لجميع المجموعات في معاملة واحدة
+            try:
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Azkar state save error: {str(e)}")
 
-    def _get_azkar(self):
-        import json
-        with open('data/Islamic_content.json') as json_file:
-            data = json.load(json_file)
-            return data.get('azkar', "لا يوجد أذكار متاحة حالياً.")
+    def _get_azkar(self, chat_id):
+        content = islamic_content.pick(chat_id)
+        if content is None:
+            return "لا يوجد أذكار متاحة حالياً."
+        # المحتوى نفسه قد يصل لعدة مجموعات فيُعاد استخدام النص المنسق
+        return templates.render_shared('azkar.md', content=content)
 
     def _process_global_event(self, update: Update, msg_text: str):
         # Logic for processing global events
         pass
 
+# Application Initialization
+def _init_database():
+    # الجداول الأم أولاً ثم تقسيماتها؛ فشل تجهيز التقسيمات لا يوقف تشغيل البوت
+    with app.app_context():
+        db.create_all()
+        try:
+            retention.prepare()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Partition setup error: {str(e)}")
+
+_init_database()
+
 # Flask Routes
 bot_instance = SaudiStockBot()
+atexit.register(outbox.flush_all)
 
 @app.route('/webhook', methods=['POST'])
 async def webhook_handler():
@@ -290,10 +522,6 @@ def handle_root_post():
 def health_check():
     return 'Bot Operational', 200
 
-# Application Initialization
-with app.app_context():
-    db.create_all()
-
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
\ No newline at end of file
@@ -8,7 +8,7 @@ class ContentRegistry(db.Model):
     id = db.Column(db.String(64), primary_key=True)
     content_type = db.Column(db.String(50))
     first_sent = db.Column(db.DateTime)
-    last_sent = db.Column(db.DateTime)
+    last_sent = db.Column(db.DateTime, index=True)
     sent_count = db.Column(db.Integer, default=1)
     related_groups = db.Column(db.JSON)
 
@@ -19,6 +19,12 @@ class GroupSettings(db.Model):
     receive_alerts = db.Column(db.Boolean, default=True)
     last_active = db.Column(db.DateTime, default=datetime.now)
     reports_enabled = db.Column(db.Boolean, default=True)
+    stock_analysis = db.Column(db.Boolean, default=True)
+    azkar = db.Column(db.Boolean, default=True)
+    remove_phone_numbers = db.Column(db.Boolean, default=True)
+    remove_urls = db.Column(db.Boolean, default=True)
+    # حالة تدوير الأذكار: bitset لكل مجموعة محتوى وآخر اختيار (انظر islamic_content)
+    azkar_state = db.Column(db.JSON)
 
 class GlobalImpact(db.Model):
     __tablename__ = 'global_events'
@@ -26,14 +32,15 @@ class GlobalImpact(db.Model):
     event_type = db.Column(db.String(50))
     impact_level = db.Column(db.Integer)
     affected_stocks = db.Column(db.JSON)
-    timestamp = db.Column(db.DateTime, default=datetime.now)
+    description = db.Column(db.Text)
+    timestamp = db.Column(db.DateTime, default=datetime.now, index=True)
 
 class CachedData(db.Model):
     __tablename__ = 'cached_data'
     id = db.Column(db.Integer, primary_key=True)
     symbol = db.Column(db.String(10))
     data = db.Column(db.String)
-    expiration = db.Column(db.DateTime)
+    expiration = db.Column(db.DateTime, index=True)
 
 class UserLimit(db.Model):
     __tablename__ = 'user_limits'
@@ -49,6 +56,10 @@ class GroupSubscription(db.Model):
 
 class Group(db.Model):
     __tablename__ = 'groups'
+    # فهرس مركب لعمليات المسح الجماعي لانتهاء الاشتراكات والتذكيرات
+    __table_args__ = (
+        db.Index('ix_groups_active_subscription_end', 'is_active', 'subscription_end'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     chat_id = db.Column(db.String(50), unique=True)
     title = db.Column(db.String(200))
@@ -81,7 +92,11 @@ class Stock(db.Model):
 
 class Opportunity(db.Model):
     __tablename__ = 'opportunities'
+    __table_args__ = (
+        db.Index('ix_opportunities_status_entry_date', 'status', 'entry_date'),
+    )
     id = db.Column(db.Integer, primary_key=True)
+    chat_id = db.Column(db.String(50))
     symbol = db.Column(db.String(10))
     strategy = db.Column(db.String(50))
     entry_date = db.Column(db.Date)
@@ -92,6 +107,31 @@ class Opportunity(db.Model):
     achieved_targets = db.Column(db.JSON, default=[])
     weekly_progress = db.Column(db.JSON, default={})
 
+class OpportunityArchive(db.Model):
+    # نسخة مختصرة من الفرص المكتملة بدون سجلات التقدم الأسبوعي
+    __tablename__ = 'opportunities_archive'
+    id = db.Column(db.Integer, primary_key=True)
+    chat_id = db.Column(db.String(50))
+    symbol = db.Column(db.String(10))
+    strategy = db.Column(db.String(50))
+    entry_date = db.Column(db.Date)
+    entry_price = db.Column(db.Float)
+    exit_price = db.Column(db.Float)
+    targets_hit = db.Column(db.Integer, default=0)
+    archived_at = db.Column(db.DateTime, default=datetime.now, index=True)
+
+class PriceHistory(db.Model):
+    # مقسم زمنياً حسب الشهر على PostgreSQL
+    __tablename__ = 'price_history'
+    __table_args__ = {'postgresql_partition_by': 'RANGE (date)'}
+    symbol = db.Column(db.String(10), primary_key=True)
+    date = db.Column(db.Date, primary_key=True, index=True)
+    open = db.Column(db.Float)
+    high = db.Column(db.Float)
+    low = db.Column(db.Float)
+    close = db.Column(db.Float)
+    volume = db.Column(db.Float)
+
 class StrategyConfig(db.Model):
     __tablename__ = 'strategies'
     id = db.Column(db.String(50), primary_key=True)
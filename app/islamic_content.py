@@ -0,0 +1,120 @@
+import os
+import json
+import random
+import threading
+import zlib
+from datetime import datetime, date
+from zoneinfo import ZoneInfo
+from utils.config import Config
+
+CONTENT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'Islamic_content.json')
+FRIDAY = 4
+
+class IslamicContentStore:
+    def __init__(self, path=CONTENT_PATH):
+        self.path = path
+        self._mtime = None
+        # بصمة المحتوى: الحالة المحفوظة لا تُستعاد إذا تغير الملف لأن مواضع العناصر تتغير
+        self._version = None
+        self._pools = {'daily': [], 'friday': []}
+        self._orders = {}
+        # لكل مجموعة ولكل مجموعة محتوى: عدد صحيح يمثل bitset للعناصر المرسلة
+        self._sent = {}
+        # آخر عنصر أُرسل لكل مجموعة في اليوم نفسه (لضمان ثبات الاختيار عند إعادة الاستدعاء)
+        self._last_pick = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        # فحص واحد لتاريخ تعديل الملف، وإعادة التحميل فقط عند تغيره
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        with open(self.path, 'rb') as json_file:
+            raw = json_file.read()
+        data = json.loads(raw.decode('utf-8'))
+        with self._lock:
+            self._pools = {
+                'daily': data.get('daily_reminders', []) + data.get('hadiths', []) + data.get('quran_verses', []),
+                'friday': data.get('friday_reminders', []) + data.get('hadiths', [])
+            }
+            self._mtime = mtime
+            self._version = zlib.crc32(raw)
+            self._orders.clear()
+            self._sent.clear()
+            self._last_pick.clear()
+        return True
+
+    def pick(self, chat_id, day=None):
+        day = day or datetime.now(ZoneInfo(Config.MARKET_TIMEZONE)).date()
+        pool_name = 'friday' if day.weekday() == FRIDAY else 'daily'
+        chat_id = str(chat_id)
+
+        with self._lock:
+            pool = self._pools[pool_name]
+            if not pool:
+                return None
+
+            last = self._last_pick.get(chat_id)
+            if last and last[0] == day:
+                return pool[last[1]]
+
+            key = (chat_id, pool_name)
+            order = self._order(key, len(pool))
+            sent = self._sent.get(key, 0)
+            full = (1 << len(pool)) - 1
+            if sent == full:
+                sent = 0
+
+            # البدء من موضع يعتمد على اليوم ثم أول عنصر لم يُرسل بعد
+            start = day.toordinal() % len(pool)
+            for step in range(len(pool)):
+                index = order[(start + step) % len(pool)]
+                if not sent & (1 << index):
+                    break
+
+            self._sent[key] = sent | (1 << index)
+            self._last_pick[chat_id] = (day, index)
+            return pool[index]
+
+    def restore(self, chat_id, state):
+        # استعادة حالة المجموعة المحفوظة في قاعدة البيانات (بعد إعادة التشغيل أو من عملية أخرى)
+        if not state or state.get('version') != self._version:
+            return
+        chat_id = str(chat_id)
+        with self._lock:
+            for pool_name, bits in (state.get('sent') or {}).items():
+                if pool_name in self._pools:
+                    self._sent.setdefault((chat_id, pool_name), int(bits, 16))
+            if state.get('day') and chat_id not in self._last_pick:
+                self._last_pick[chat_id] = (date.fromisoformat(state['day']), state['index'])
+
+    def state(self, chat_id):
+        # حالة مختصرة للحفظ: bitset لكل مجموعة محتوى كنص سداسي عشري وآخر اختيار
+        chat_id = str(chat_id)
+        with self._lock:
+            last = self._last_pick.get(chat_id)
+            return {
+                'version': self._version,
+                'sent': {
+                    pool_name: format(self._sent[(chat_id, pool_name)], 'x')
+                    for pool_name in self._pools if (chat_id, pool_name) in self._sent
+                },
+                'day': last[0].isoformat() if last else None,
+                'index': last[1] if last else None
+            }
+
+    def _order(self, key, size):
+        order = self._orders.get(key)
+        if order is None:
+            # ترتيب ثابت لكل مجموعة في جميع العمليات (crc32 بدلاً من hash العشوائي)
+            seed = zlib.crc32(f"{key[0]}:{key[1]}".encode())
+            order = list(range(size))
+            random.Random(seed).shuffle(order)
+            self._orders[key] = order
+        return order
+
+islamic_content = IslamicContentStore()
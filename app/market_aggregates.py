@@ -0,0 +1,159 @@
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+
+@dataclass
+class Mover:
+    symbol: str
+    name: str
+    sector: str
+    close: float
+    change: float
+    volume: float
+
+@dataclass
+class SectorStats:
+    sector: str
+    change: float
+    volume: float
+    advancers: int
+    decliners: int
+    count: int
+
+@dataclass
+class MarketSnapshot:
+    as_of: datetime
+    index_change: float
+    advancers: int
+    decliners: int
+    unchanged: int
+    total_volume: float
+    gainers: List[Mover] = field(default_factory=list)
+    losers: List[Mover] = field(default_factory=list)
+    sectors: Dict[str, SectorStats] = field(default_factory=dict)
+    changes: Dict[str, float] = field(default_factory=dict)
+    closes: Dict[str, float] = field(default_factory=dict)
+
+    def change_for(self, symbol: str) -> Optional[float]:
+        return self.changes.get(symbol)
+
+    def price_for(self, symbol: str) -> Optional[float]:
+        return self.closes.get(symbol)
+
+# يحسب مؤشرات السوق والقطاعات وأعلى/أدنى الأسهم مرة واحدة لكل شمعة
+class MarketAggregator:
+    def __init__(self, top_n=5):
+        self.top_n = top_n
+        self._sector_map = {}
+        self._name_map = {}
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def load_stocks(self, stocks):
+        # stocks: عناصر تحتوي على symbol و name و sector (مثل نموذج Stock)
+        self._sector_map = {s.symbol: (s.sector or 'غير مصنف') for s in stocks}
+        self._name_map = {s.symbol: (s.name or s.symbol) for s in stocks}
+
+    @property
+    def snapshot(self) -> Optional[MarketSnapshot]:
+        return self._snapshot
+
+    def on_bar(self, symbols, prev_close, close, volume, as_of=None) -> Optional[MarketSnapshot]:
+        symbols = np.asarray(symbols, dtype=object)
+        prev_close = np.asarray(prev_close, dtype=np.float64)
+        close = np.asarray(close, dtype=np.float64)
+        volume = np.asarray(volume, dtype=np.float64)
+
+        # استبعاد الأسهم التي لا تملك سعر إغلاق سابق صالح
+        valid = np.isfinite(prev_close) & np.isfinite(close) & (prev_close > 0)
+        if not valid.any():
+            return self._snapshot
+        symbols, prev_close, close = symbols[valid], prev_close[valid], close[valid]
+        volume = np.nan_to_num(volume[valid])
+
+        change = (close - prev_close) / prev_close * 100
+
+        # المؤشر العام: تغير مرجح بالأسعار (تقريب لمؤشر السوق حتى توفر القيمة السوقية)
+        index_change = float((close.sum() - prev_close.sum()) / prev_close.sum() * 100)
+
+        snapshot = MarketSnapshot(
+            as_of=as_of or datetime.now(),
+            index_change=round(index_change, 2),
+            advancers=int((change > 0).sum()),
+            decliners=int((change < 0).sum()),
+            unchanged=int((change == 0).sum()),
+            total_volume=float(volume.sum()),
+            gainers=self._top_movers(symbols, close, change, volume, largest=True),
+            losers=self._top_movers(symbols, close, change, volume, largest=False),
+            sectors=self._sector_stats(symbols, prev_close, close, change, volume),
+            changes=dict(zip(symbols.tolist(), np.round(change, 2).tolist())),
+            closes=dict(zip(symbols.tolist(), close.tolist()))
+        )
+
+        with self._lock:
+            self._snapshot = snapshot
+        return snapshot
+
+    def on_frame(self, frame, as_of=None) -> Optional[MarketSnapshot]:
+        # frame: DataFrame مفهرس بالرمز ويحتوي prev_close و close و volume
+        return self.on_bar(
+            frame.index.to_numpy(),
+            frame['prev_close'].to_numpy(),
+            frame['close'].to_numpy(),
+            frame['volume'].to_numpy(),
+            as_of=as_of
+        )
+
+    def _top_movers(self, symbols, close, change, volume, largest):
+        n = min(self.top_n, len(change))
+        if n == 0:
+            return []
+        key = -change if largest else change
+        # اختيار جزئي O(n) ثم ترتيب العناصر المختارة فقط
+        idx = np.argpartition(key, n - 1)[:n] if n < len(key) else np.arange(len(key))
+        idx = idx[np.argsort(key[idx], kind='stable')]
+        if largest:
+            idx = idx[change[idx] > 0]
+        else:
+            idx = idx[change[idx] < 0]
+        return [self._mover(symbols[i], close[i], change[i], volume[i]) for i in idx]
+
+    def _mover(self, symbol, close, change, volume):
+        return Mover(
+            symbol=symbol,
+            name=self._name_map.get(symbol, symbol),
+            sector=self._sector_map.get(symbol, 'غير مصنف'),
+            close=round(float(close), 2),
+            change=round(float(change), 2),
+            volume=float(volume)
+        )
+
+    def _sector_stats(self, symbols, prev_close, close, change, volume):
+        sectors = np.array([self._sector_map.get(s, 'غير مصنف') for s in symbols], dtype=object)
+        names, codes = np.unique(sectors, return_inverse=True)
+        k = len(names)
+
+        prev_sum = np.bincount(codes, weights=prev_close, minlength=k)
+        close_sum = np.bincount(codes, weights=close, minlength=k)
+        vol_sum = np.bincount(codes, weights=volume, minlength=k)
+        adv = np.bincount(codes, weights=(change > 0), minlength=k)
+        dec = np.bincount(codes, weights=(change < 0), minlength=k)
+        count = np.bincount(codes, minlength=k)
+        sector_change = (close_sum - prev_sum) / prev_sum * 100
+
+        return {
+            name: SectorStats(
+                sector=name,
+                change=round(float(sector_change[i]), 2),
+                volume=float(vol_sum[i]),
+                advancers=int(adv[i]),
+                decliners=int(dec[i]),
+                count=int(count[i])
+            )
+            for i, name in enumerate(names)
+        }
+
+# نسخة مشتركة تقرأ منها التقارير والإعدادات والتنبيهات
+market_aggregator = MarketAggregator()
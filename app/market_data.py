@@ -1,24 +1,87 @@
-import pandas_datareader as pdr
+import logging
+import yfinance as yf
 import pandas as pd
 from datetime import datetime
 
 # باقي الكود هنا...
 from sqlalchemy import update
 from app.database import db, Stock
+from app.market_aggregates import market_aggregator
+from app.stock_index import stock_index
+
+# لاحقة أسهم تداول في Yahoo Finance
+TADAWUL_SUFFIX = '.SR'
+
+def _ticker(symbol):
+    return symbol if symbol.endswith(TADAWUL_SUFFIX) else f"{symbol}{TADAWUL_SUFFIX}"
 
 class SaudiMarketData:
     def update_stock_list(self):
-        # كود لتحديث قائمة الأسهم باستخدام pandas_datareader
-        pass
+        self.refresh_stock_index()
+
+    def refresh_stock_index(self):
+        # إعادة بناء فهرس البحث عن الأسهم من جدول Stock
+        return stock_index.load(db.session.query(Stock).all())
 
     def get_stock_data(self, symbol, period='1y'):
         try:
-            return pdr.get_data_yahoo(symbol, period=period)
-        except:
+            data = yf.Ticker(_ticker(symbol)).history(period=period, auto_adjust=False)
+            return data if not data.empty else None
+        except Exception:
             return None
 
-    def get_current_price(self, symbol):
+    def get_many(self, symbols, period='1y'):
+        # طلب واحد لجميع الرموز بدلاً من طلب لكل سهم؛ النتيجة {symbol: DataFrame}
+        tickers = {_ticker(symbol): symbol for symbol in symbols}
+        if not tickers:
+            return {}
         try:
-            return pdr.get_data_yahoo(symbol, period='1d')['Close'][-1]
-        except:
-            return None
\ No newline at end of file
+            data = yf.download(
+                list(tickers), period=period, group_by='ticker',
+                auto_adjust=False, threads=True, progress=False
+            )
+        except Exception as e:
+            logging.error(f"Batch download error: {str(e)}")
+            return {}
+        if data is None or data.empty:
+            logging.warning(f"Batch download returned no data for {len(tickers)} symbols")
+            return {}
+        # سهم واحد يعود بأعمدة بسيطة، وعدة أسهم بأعمدة (الرمز، الحقل)
+        if not isinstance(data.columns, pd.MultiIndex):
+            data = pd.concat({next(iter(tickers)): data}, axis=1)
+        frames = {}
+        for ticker in data.columns.get_level_values(0).unique():
+            frame = data[ticker].dropna(subset=['Close'])
+            if not frame.empty and ticker in tickers:
+                frames[tickers[ticker]] = frame
+        return frames
+
+    def get_latest_bars(self, symbols):
+        # آخر شمعتين لكل سهم: الإغلاق السابق والحالي والحجم
+        rows = {
+            symbol: {
+                'prev_close': data['Close'].iloc[-2],
+                'close': data['Close'].iloc[-1],
+                'volume': data['Volume'].iloc[-1]
+            }
+            for symbol, data in self.get_many(symbols, period='5d').items()
+            if len(data) >= 2
+        }
+        return pd.DataFrame.from_dict(rows, orient='index', columns=['prev_close', 'close', 'volume'])
+
+    def get_market_frames(self, symbols, period='1y'):
+        # بيانات جميع الأسهم لمسح الاستراتيجيات
+        return self.get_many(symbols, period=period)
+
+    def refresh_market_snapshot(self):
+        # تحديث لقطة السوق مرة واحدة لكل شمعة جديدة بطلب واحد لجميع الأسهم
+        stocks = db.session.query(Stock).all()
+        market_aggregator.load_stocks(stocks)
+        bars = self.get_latest_bars([s.symbol for s in stocks])
+        if bars.empty:
+            return market_aggregator.snapshot
+        return market_aggregator.on_frame(bars)
+
+    def get_current_price(self, symbol):
+        data = self.get_stock_data(symbol, period='1d')
+        return float(data['Close'].iloc[-1]) if data is not None else None
\ No newline at end of file
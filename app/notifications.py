@@ -1,10 +1,12 @@
-from telegram import ParseMode, InputMediaPhoto
-import matplotlib.pyplot as plt
+from telegram import InputMediaPhoto
+from telegram.constants import ParseMode
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import io
 from app.database import db, Opportunity, Stock
+from app.templating import templates
+from app.outbox import outbox
 
 class NotificationManager:
     @staticmethod
@@ -52,6 +54,8 @@ class NotificationManager:
         ).all()
         stocks = {s.symbol: s.name for s in db.session.query(Stock).all()}
         report_data = {
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d'),
             'total_opportunities': len(opportunities),
             'completed': [],
             'active': [],
@@ -96,28 +100,51 @@ class NotificationManager:
             report_data['worst_performers'] = report_data['worst_performers'][:5]
 
     def _format_report(self, data, stocks):
-        report = "📊 <b>التقرير الأسبوعي الشامل</b>\n\n"
-        report += f"📅 الفترة من {data['start_date']} إلى {data['end_date']}\n\n"
-        report += "📈 <b>ملخص الأداء:</b>\n"
-        report += f"- عدد الفرص المطروحة: {data['total_opportunities']}\n"
-        report += f"- الفرص المكتملة: {len(data['completed'])}\n"
-        report += f"- الفرص النشطة: {len(data['active'])}\n"
-        report += f"- إجمالي الربح: {data['total_profit']:.2f}%\n\n"
-        report += "🏆 <b>أفضل 5 أداء:</b>\n"
-        for idx, opp in enumerate(data['best_performers'], 1):
-            report += f"{idx}. {opp['name']} ({opp['symbol']})\n"
-            report += f"   الاستراتيجية: {opp['strategy']}\n"
-            report += f"   الربح: {opp['profit']}% خلال {opp['duration']} يوم\n\n"
-        report += "📉 <b>أدنى 5 أداء:</b>\n"
-        for idx, opp in enumerate(data['worst_performers'], 1):
-            report += f"{idx}. {opp['name']} ({opp['symbol']})\n"
-            report += f"   الاستراتيجية: {opp['strategy']}\n"
-            report += f"   الربح: {opp['profit']}% خلال {opp['duration']} يوم\n\n"
-        report += "📌 <b>الفرص النشطة:</b>\n"
-        for opp in data['active']:
-            current_target = opp.targets[f'target{opp.current_target}']
-            report += f"- {stocks[opp.symbol]} ({opp.symbol}): الهدف {opp.current_target} ({current_target:.2f})\n"
-        return report
+        # تجميع الأجزاء ثم ضمها مرة واحدة بدلاً من الإلحاق المتكرر
+        def _performers(entries):
+            return templates.render_many(
+                'weekly_performer.html',
+                [dict(entry, rank=idx) for idx, entry in enumerate(entries, 1)],
+                parse_mode='HTML'
+            )
+
+        active = templates.render_many(
+            'weekly_active.html',
+            [
+                {
+                    'name': stocks.get(opp.symbol, 'غير معروف'),
+                    'symbol': opp.symbol,
+                    'current_target': opp.current_target,
+                    'target_price': opp.targets[str(opp.current_target)]
+                }
+                for opp in data['active']
+            ],
+            parse_mode='HTML'
+        )
+        return templates.render(
+            'weekly_report.html',
+            parse_mode='HTML',
+            start_date=data['start_date'],
+            end_date=data['end_date'],
+            total_opportunities=data['total_opportunities'],
+            completed=len(data['completed']),
+            active=len(data['active']),
+            total_profit=data['total_profit'],
+            best_performers=_performers(data['best_performers']),
+            worst_performers=_performers(data['worst_performers']),
+            active_opportunities=active
+        )
+
+    def send_goal_alert(self, chat_id, message, key=None):
+        # تحقيق الأهداف يُحدّث رسالة الحالة المثبتة بدلاً من رسالة مستقلة
+        outbox.update_status(chat_id, key or message, message)
+
+    def send_goal_update(self, chat_id, message, key=None):
+        outbox.update_status(chat_id, key or message, message)
+
+    def send_signal(self, chat_id, message):
+        # إشارات الفرص تُجمع في ملخص واحد لكل مجموعة
+        outbox.enqueue(chat_id, message)
 
     def send_report(self, chat_id, report):
         self._send_message(chat_id, report, parse_mode=ParseMode.HTML)
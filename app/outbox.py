@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from telegram import Bot
+from app.templating import templates, Raw, escape_markdown
+from utils.config import Config
+
+class _EventLoopThread:
+    # حلقة أحداث واحدة طويلة العمر في خيط مستقل: اتصالات Bot المشتركة مرتبطة بالحلقة
+    # التي أنشأتها، فإنشاء حلقة جديدة لكل إرسال (asyncio.run) يُغلقها بعد أول استدعاء
+    def __init__(self):
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _ensure(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name='bot-loop', daemon=True).start()
+            return self._loop
+
+    def run(self, coroutine, timeout):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure()).result(timeout)
+
+_loop_thread = _EventLoopThread()
+
+def run_sync(result, timeout=30):
+    # واجهة Bot غير متزامنة؛ تُنفذ من خيوط المؤقت والمجدول عبر الحلقة المشتركة
+    if asyncio.iscoroutine(result):
+        return _loop_thread.run(result, timeout)
+    return result
+
+class OutboundCoalescer:
+    def __init__(self, bot=None, settings=None):
+        self.settings = settings or Config.OUTBOX
+        self._bot = bot
+        # chat_id -> قائمة الرسائل المنتظرة
+        self._pending = {}
+        # chat_id -> {key: سطر الحالة} لرسالة الحالة المثبتة
+        self._status = {}
+        self._dirty = set()
+        # chat_id -> message_id لرسالة الحالة المثبتة
+        self._status_messages = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def bot(self):
+        if self._bot is None:
+            self._bot = Bot(token=Config.TELEGRAM_TOKEN)
+        return self._bot
+
+    def enqueue(self, chat_id, text):
+        # رسالة جديدة تُدمج مع ما يصل للمجموعة نفسها خلال نافذة قصيرة
+        chat_id = str(chat_id)
+        with self._lock:
+            pending = self._pending.setdefault(chat_id, [])
+            pending.append(text)
+            flush_now = len(pending) >= self.settings['max_batch']
+        if flush_now:
+            self.flush(chat_id)
+        else:
+            self._schedule(chat_id)
+
+    def update_status(self, chat_id, key, line):
+        # تحديث سطر في رسالة الحالة المثبتة بدلاً من إرسال رسالة جديدة
+        chat_id = str(chat_id)
+        with self._lock:
+            board = self._status.setdefault(chat_id, OrderedDict())
+            board[key] = line
+            board.move_to_end(key)
+            while len(board) > self.settings['max_status_lines']:
+                board.popitem(last=False)
+            self._dirty.add(chat_id)
+        self._schedule(chat_id)
+
+    def set_status_message(self, chat_id, message_id):
+        with self._lock:
+            self._status_messages[str(chat_id)] = message_id
+
+    def _schedule(self, chat_id):
+        with self._lock:
+            if chat_id in self._timers:
+                return
+            timer = threading.Timer(self.settings['window_seconds'], self.flush, args=(chat_id,))
+            timer.daemon = True
+            self._timers[chat_id] = timer
+        timer.start()
+
+    def flush(self, chat_id):
+        chat_id = str(chat_id)
+        with self._lock:
+            timer = self._timers.pop(chat_id, None)
+            messages = self._pending.pop(chat_id, [])
+            board = list(self._status.get(chat_id, {}).values()) if chat_id in self._dirty else None
+            self._dirty.discard(chat_id)
+        if timer is not None:
+            timer.cancel()
+
+        try:
+            if messages:
+                self._send_digest(chat_id, messages)
+            if board:
+                self._publish_status(chat_id, board)
+        except Exception as e:
+            logging.error(f"Outbox flush error for {chat_id}: {str(e)}")
+
+    def flush_all(self):
+        with self._lock:
+            chats = set(self._pending) | set(self._dirty)
+        for chat_id in chats:
+            self.flush(chat_id)
+
+    def _send_digest(self, chat_id, messages):
+        if len(messages) == 1:
+            # الرسائل المنسقة من القوالب (Raw) تُرسل كما هي، والنص العادي يُهرّب
+            message = messages[0]
+            text = message if isinstance(message, Raw) else escape_markdown(message)
+            run_sync(self.bot.send_message(chat_id=chat_id, text=text, parse_mode='Markdown'))
+            return
+        for chunk in self._chunks(messages):
+            text = templates.render(
+                'digest.md',
+                count=len(chunk),
+                items=templates.render_many('digest_item.md', [{'text': m} for m in chunk])
+            )
+            run_sync(self.bot.send_message(chat_id=chat_id, text=text, parse_mode='Markdown'))
+
+    def _chunks(self, messages):
+        # تقسيم الملخص حتى لا يتجاوز حد طول رسالة تيليجرام
+        chunk, size = [], 0
+        for message in messages:
+            if chunk and size + len(message) > self.settings['max_length']:
+                yield chunk
+                chunk, size = [], 0
+            chunk.append(message)
+            size += len(message) + 3
+        if chunk:
+            yield chunk
+
+    def _publish_status(self, chat_id, lines):
+        updated = datetime.now(ZoneInfo(Config.MARKET_TIMEZONE)).strftime('%H:%M')
+        text = templates.render(
+            'live_status.md',
+            items=templates.render_many('digest_item.md', [{'text': line} for line in lines]),
+            updated=updated
+        )
+        message_id = self._status_messages.get(chat_id)
+        if message_id is not None:
+            try:
+                run_sync(self.bot.edit_message_text(
+                    chat_id=chat_id, message_id=message_id, text=text, parse_mode='Markdown'
+                ))
+                return
+            except Exception as e:
+                # الرسالة حُذفت أو لم تعد قابلة للتعديل: نرسل رسالة حالة جديدة
+                logging.warning(f"Live status edit failed for {chat_id}: {str(e)}")
+
+        message = run_sync(self.bot.send_message(chat_id=chat_id, text=text, parse_mode='Markdown'))
+        self.set_status_message(chat_id, message.message_id)
+        try:
+            run_sync(self.bot.pin_chat_message(
+                chat_id=chat_id, message_id=message.message_id, disable_notification=True
+            ))
+        except Exception as e:
+            logging.warning(f"Live status pin failed for {chat_id}: {str(e)}")
+
+outbox = OutboundCoalescer()
@@ -0,0 +1,154 @@
+import re
+import time
+import logging
+from datetime import datetime, date
+from sqlalchemy import select, delete, text, tuple_
+from app.database import (
+    db, ContentRegistry, GlobalImpact, CachedData, Opportunity, OpportunityArchive, PriceHistory
+)
+from utils.config import Config
+
+# الجدول -> (النموذج، عمود الوقت الذي تُحسب منه مدة الاحتفاظ)
+RETENTION_RULES = {
+    'content_registry': (ContentRegistry, 'last_sent'),
+    'global_events': (GlobalImpact, 'timestamp'),
+    'cached_data': (CachedData, 'expiration'),
+    'opportunities_archive': (OpportunityArchive, 'archived_at'),
+    'price_history': (PriceHistory, 'date')
+}
+
+# الجداول المقسمة شهرياً على PostgreSQL: حذف التقسيم القديم بدلاً من حذف الصفوف
+PARTITIONED_TABLES = {'price_history'}
+
+_PARTITION_NAME = re.compile(r'_(\d{4})_(\d{2})$')
+
+def _month_start(day, offset=0):
+    month = day.month - 1 + offset
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+class RetentionManager:
+    def __init__(self, settings=None):
+        self.settings = settings or Config.RETENTION
+
+    @property
+    def is_postgresql(self):
+        return db.engine.dialect.name == 'postgresql'
+
+    def prepare(self):
+        # إنشاء التقسيمات القادمة قبل وصول البيانات إليها
+        if self.is_postgresql:
+            for table in PARTITIONED_TABLES:
+                self._ensure_partitions(table)
+
+    def run(self):
+        results = {'opportunities_archived': self.archive_completed()}
+        now = datetime.now()
+        for table, ttl in self.settings['tables'].items():
+            model, column = RETENTION_RULES[table]
+            cutoff = now - ttl
+            if table in PARTITIONED_TABLES:
+                cutoff = cutoff.date()
+                if self.is_postgresql:
+                    self._ensure_partitions(table)
+                    results[table] = self._drop_partitions(table, cutoff)
+                    # الصفوف القديمة في التقسيم الافتراضي لا تسقط مع أي تقسيم شهري
+                    self._batched_delete(model, getattr(model, column), cutoff)
+                    continue
+            results[table] = self._batched_delete(model, getattr(model, column), cutoff)
+        logging.info(f"Retention run: {results}")
+        return results
+
+    def archive_completed(self):
+        # نقل الفرص المكتملة إلى جدول الأرشيف المختصر على دفعات
+        cutoff = (datetime.now() - self.settings['archive_completed_after']).date()
+        archived = 0
+        while True:
+            batch = db.session.query(Opportunity).filter(
+                Opportunity.status == 'completed',
+                Opportunity.entry_date < cutoff
+            ).order_by(Opportunity.id).limit(self.settings['batch_size']).all()
+            if not batch:
+                break
+            db.session.bulk_insert_mappings(OpportunityArchive, [
+                {
+                    'id': opp.id,
+                    'chat_id': opp.chat_id,
+                    'symbol': opp.symbol,
+                    'strategy': opp.strategy,
+                    'entry_date': opp.entry_date,
+                    'entry_price': opp.entry_price,
+                    'exit_price': opp.achieved_targets[-1].get('price') if opp.achieved_targets else None,
+                    'targets_hit': len(opp.achieved_targets or []),
+                    'archived_at': datetime.now()
+                }
+                for opp in batch
+            ])
+            db.session.execute(
+                delete(Opportunity).where(Opportunity.id.in_([opp.id for opp in batch]))
+            )
+            db.session.commit()
+            archived += len(batch)
+            self._pause()
+        return archived
+
+    def _batched_delete(self, model, column, cutoff):
+        # حذف على دفعات صغيرة مع تثبيت كل دفعة حتى لا تُقفل الجداول النشطة طويلاً
+        pk = list(model.__mapper__.primary_key)
+        key = pk[0] if len(pk) == 1 else tuple_(*pk)
+        deleted = 0
+        while True:
+            ids = select(*pk).where(column < cutoff).limit(self.settings['batch_size'])
+            count = db.session.execute(
+                delete(model).where(key.in_(ids))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            deleted += count
+            if count < self.settings['batch_size']:
+                break
+            self._pause()
+        return deleted
+
+    def _ensure_partitions(self, table):
+        # تقسيم لكل شهر داخل نافذة الاحتفاظ كاملة (سجل الأسعار التاريخي يُكتب بتواريخ قديمة)
+        # وحتى الأشهر القادمة، وتقسيم افتراضي يستقبل ما يقع خارجها بدلاً من رفض الإدراج
+        today = date.today()
+        start = _month_start(today - self.settings['tables'][table])
+        last = _month_start(today, self.settings['partition_months_ahead'] + 1)
+        while start < last:
+            end = _month_start(start, 1)
+            db.session.execute(text(
+                f'CREATE TABLE IF NOT EXISTS {table}_{start:%Y_%m} PARTITION OF {table} '
+                f"FOR VALUES FROM ('{start}') TO ('{end}')"
+            ))
+            start = end
+        db.session.execute(text(
+            f'CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT'
+        ))
+        db.session.commit()
+
+    def _drop_partitions(self, table, cutoff):
+        partitions = db.session.execute(text(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class parent ON pg_inherits.inhparent = parent.oid '
+            'JOIN pg_class child ON pg_inherits.inhrelid = child.oid '
+            'WHERE parent.relname = :table'
+        ), {'table': table}).scalars().all()
+        dropped = 0
+        for name in partitions:
+            match = _PARTITION_NAME.search(name)
+            if not match:
+                continue
+            # التقسيم يُحذف فقط إذا انتهى نطاقه بالكامل قبل تاريخ القطع
+            end = _month_start(date(int(match.group(1)), int(match.group(2)), 1), 1)
+            if end <= cutoff:
+                db.session.execute(text(f'DROP TABLE IF EXISTS {name}'))
+                dropped += 1
+        db.session.commit()
+        return dropped
+
+    def _pause(self):
+        if self.settings['batch_pause_seconds']:
+            time.sleep(self.settings['batch_pause_seconds'])
+
+retention = RetentionManager()
@@ -0,0 +1,157 @@
+import os
+import atexit
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from utils.config import Config
+
+PANEL_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+class SharedPricePanel:
+    # جميع أسعار السوق في كتلتي ذاكرة مشتركة: القيم (صفوف × أعمدة) والتواريخ،
+    # مع مؤشرات بداية ونهاية كل سهم
+    def __init__(self, frames):
+        self.symbols = list(frames)
+        lengths = [len(frames[s]) for s in self.symbols]
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        rows = int(self.offsets[-1])
+
+        self._values = shared_memory.SharedMemory(create=True, size=max(rows * len(PANEL_COLUMNS) * 8, 1))
+        self._dates = shared_memory.SharedMemory(create=True, size=max(rows * 8, 1))
+        values = np.ndarray((rows, len(PANEL_COLUMNS)), dtype=np.float64, buffer=self._values.buf)
+        dates = np.ndarray((rows,), dtype=np.int64, buffer=self._dates.buf)
+
+        for i, symbol in enumerate(self.symbols):
+            frame = frames[symbol]
+            start, end = self.offsets[i], self.offsets[i + 1]
+            values[start:end] = frame.reindex(columns=PANEL_COLUMNS).to_numpy(dtype=np.float64)
+            index = pd.DatetimeIndex(frame.index)
+            if index.tz is not None:
+                # نحفظ وقت السوق المحلي دون منطقة زمنية كما يتوقعه مُعيد التجميع، لا وقت UTC
+                index = index.tz_convert(Config.MARKET_TIMEZONE).tz_localize(None)
+            dates[start:end] = index.as_unit('ns').asi8
+
+    def descriptor(self):
+        # وصف صغير يُرسل للعمال بدلاً من البيانات نفسها
+        return {
+            'symbols': self.symbols,
+            'offsets': self.offsets,
+            'values': self._values.name,
+            'dates': self._dates.name
+        }
+
+    def close(self):
+        for block in (self._values, self._dates):
+            block.close()
+            block.unlink()
+
+# حالة كل عملية عاملة: الاستراتيجيات (وذاكرتها المؤقتة) تبقى طوال عمر العملية،
+# واللوحة المشتركة يُعاد ربطها فقط عند وصول لوحة جديدة
+_worker = {}
+
+def _init_worker():
+    from app.strategies import TradingStrategies
+    _worker['strategies'] = TradingStrategies()
+
+def _attach(descriptor):
+    if _worker.get('panel') == descriptor['values']:
+        return
+    for block in _worker.pop('blocks', ()):
+        block.close()
+    values = shared_memory.SharedMemory(name=descriptor['values'])
+    dates = shared_memory.SharedMemory(name=descriptor['dates'])
+    rows = int(descriptor['offsets'][-1])
+    _worker.update(
+        panel=descriptor['values'],
+        symbols=descriptor['symbols'],
+        offsets=descriptor['offsets'],
+        blocks=(values, dates),
+        values=np.ndarray((rows, len(PANEL_COLUMNS)), dtype=np.float64, buffer=values.buf),
+        dates=np.ndarray((rows,), dtype='datetime64[ns]', buffer=dates.buf)
+    )
+
+def _detect(strategies, symbol, frame, active):
+    try:
+        return strategies.detect_signals(symbol, frame, active)
+    except Exception as e:
+        logging.error(f"Scan error for {symbol}: {str(e)}")
+        return []
+
+def _scan_shard(descriptor, start, end, active):
+    _attach(descriptor)
+    symbols, offsets = _worker['symbols'], _worker['offsets']
+    results = []
+    for i in range(start, end):
+        lo, hi = offsets[i], offsets[i + 1]
+        if hi - lo < 2:
+            continue
+        # إطار بيانات فوق الذاكرة المشتركة مباشرة دون نسخ أو pickle
+        frame = pd.DataFrame(
+            _worker['values'][lo:hi], columns=PANEL_COLUMNS,
+            index=pd.DatetimeIndex(_worker['dates'][lo:hi]), copy=False
+        )
+        signals = _detect(_worker['strategies'], symbols[i], frame, active)
+        if signals:
+            results.append((i, signals))
+    return results
+
+class ParallelScanExecutor:
+    def __init__(self, max_workers=None, shards_per_worker=4):
+        self.max_workers = max_workers or Config.PERFORMANCE.get('scan_workers') or os.cpu_count() or 1
+        self.shards_per_worker = shards_per_worker
+        self._pool = None
+
+    def _get_pool(self):
+        # مجمع دائم حتى تبقى ذاكرة الاستراتيجيات المؤقتة في العمال بين عمليات المسح؛
+        # العمال تُنشأ بـ forkserver/spawn لا fork لأن العملية الأم تشغّل خيوط المجدول والكتابة وقاعدة البيانات
+        if self._pool is None:
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=_init_worker
+            )
+            atexit.register(self.shutdown)
+        return self._pool
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def scan(self, strategies, frames):
+        # frames: {symbol: DataFrame}؛ النتائج بترتيب الأسهم ثم ترتيب الاستراتيجيات
+        if not frames:
+            return []
+        active = strategies.active_strategies()
+        if self.max_workers == 1 or len(frames) < self.max_workers:
+            return [
+                signal
+                for symbol, frame in frames.items()
+                for signal in _detect(strategies, symbol, frame, active)
+            ]
+
+        panel = SharedPricePanel(frames)
+        try:
+            n = len(panel.symbols)
+            shard = max(1, -(-n // (self.max_workers * self.shards_per_worker)))
+            bounds = [(start, min(start + shard, n)) for start in range(0, n, shard)]
+            descriptor = panel.descriptor()
+            pool = self._get_pool()
+            try:
+                futures = [pool.submit(_scan_shard, descriptor, start, end, active) for start, end in bounds]
+                merged = [item for future in futures for item in future.result()]
+            except BrokenProcessPool:
+                # عامل انتهى بشكل غير متوقع: مجمع جديد في المسح التالي
+                self.shutdown()
+                raise
+        finally:
+            panel.close()
+
+        merged.sort(key=lambda item: item[0])
+        return [signal for _, signals in merged for signal in signals]
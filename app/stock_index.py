@@ -0,0 +1,243 @@
+import re
+import threading
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import List, Optional
+
+# أسماء شائعة يكتبها المستخدمون بدلاً من الاسم الرسمي
+ALIASES = {
+    '2222': ['أرامكو', 'ارامكو', 'aramco'],
+    '1120': ['الراجحي', 'مصرف الراجحي', 'rajhi', 'alrajhi'],
+    '1180': ['الأهلي', 'البنك الأهلي', 'snb'],
+    '2010': ['سابك', 'sabic'],
+    '7010': ['الاتصالات', 'اس تي سي', 'stc'],
+    '2280': ['المراعي', 'almarai'],
+    '1211': ['معادن', 'maaden'],
+    '2082': ['أكوا باور', 'اكوا', 'acwa'],
+    '4001': ['العثيم', 'othaim']
+}
+
+# كلمات عامة لا تكفي وحدها لتمييز الشركة (بعد التطبيع)
+_GENERIC_WORDS = {
+    'شركه', 'الشركه', 'مصرف', 'بنك', 'البنك', 'مجموعه', 'المجموعه', 'السعوديه', 'العربيه',
+    'اسواق', 'الاسواق', 'عبدالله', 'محمد', 'الوطنيه', 'المتحده', 'الدوليه', 'القابضه',
+    'التعاونيه', 'للتامين', 'للاستثمار', 'الخليج', 'الخليجيه', 'الاولي', 'الشرق', 'الاوسط'
+}
+# أقصر مفتاح يُقبل كصيغة مشتقة أو في المطابقة التقريبية
+_MIN_KEY_LENGTH = 4
+# كلمات تسبق رمز السهم داخل النص (سهم 2222، رمز 2222، #2222)
+_CODE_MARKERS = {'سهم', 'رمز', 'كود'}
+_HASH_CODE = re.compile(r'#\s*(\d+)')
+
+_DIACRITICS = re.compile('[\\u064B-\\u065F\\u0670\\u0640]')
+_CHAR_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ة': 'ه', 'ى': 'ي', 'ؤ': 'و', 'ئ': 'ي',
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9'
+})
+_NON_WORD = re.compile(r'[^\w\s]')
+_SPACES = re.compile(r'\s+')
+_END = '\0'
+
+def normalize(text: str) -> str:
+    text = _DIACRITICS.sub('', text.lower()).translate(_CHAR_MAP)
+    return _SPACES.sub(' ', _NON_WORD.sub(' ', text)).strip()
+
+def _trigrams(text: str):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+@dataclass
+class StockEntry:
+    symbol: str
+    name: str
+    sector: str
+
+class StockLookupIndex:
+    def __init__(self, fuzzy_threshold=0.45):
+        self.fuzzy_threshold = fuzzy_threshold
+        self._entries = {}
+        self._keys = {}
+        self._ambiguous = set()
+        self._trie = {}
+        self._trigrams = {}
+        self._gram_counts = {}
+        self._lock = threading.Lock()
+
+    def load(self, stocks):
+        # بناء الفهارس كاملة ثم استبدالها دفعة واحدة حتى لا تتأثر عمليات البحث الجارية
+        entries = {
+            s.symbol: StockEntry(symbol=s.symbol, name=s.name or s.symbol, sector=s.sector or '')
+            for s in stocks
+        }
+        # key -> {symbol: الأولوية}؛ الاسم الكامل والاسم المختصر أولى من الصيغ المشتقة
+        candidates = defaultdict(dict)
+        names = [(symbol, entry.name) for symbol, entry in entries.items()]
+        # الأسماء المختصرة للأسهم المحملة فقط
+        names += [
+            (symbol, alias)
+            for symbol, aliases in ALIASES.items() if symbol in entries
+            for alias in aliases
+        ]
+        for symbol, name in names:
+            for i, key in enumerate(self._variants(name)):
+                rank = 0 if i == 0 else 1
+                candidates[key][symbol] = min(rank, candidates[key].get(symbol, rank))
+
+        # المفتاح المشترك بين أكثر من سهم بالأولوية نفسها لا يُنسب لأي منها
+        keys, ambiguous = {}, set()
+        for key, ranks in candidates.items():
+            best = min(ranks.values())
+            symbols = [symbol for symbol, rank in ranks.items() if rank == best]
+            if len(symbols) == 1:
+                keys[key] = symbols[0]
+            else:
+                ambiguous.add(key)
+
+        trie = {}
+        for key, symbol in keys.items():
+            node = trie
+            for ch in key:
+                node = node.setdefault(ch, {})
+            node[_END] = symbol
+
+        trigrams, gram_counts = defaultdict(set), {}
+        for key in keys:
+            grams = _trigrams(key)
+            gram_counts[key] = len(grams)
+            for gram in grams:
+                trigrams[gram].add(key)
+
+        with self._lock:
+            self._entries = entries
+            self._keys = keys
+            self._ambiguous = ambiguous
+            self._trie = trie
+            self._trigrams = dict(trigrams)
+            self._gram_counts = gram_counts
+        return len(entries)
+
+    def _variants(self, text):
+        key = normalize(text)
+        if not key:
+            return []
+        variants = [key]
+        # السماح بكتابة الاسم دون أداة التعريف (الراجحي / راجحي)
+        words = key.split(' ')
+        if words[0].startswith('ال') and len(words[0]) > 3:
+            variants.append(' '.join([words[0][2:]] + words[1:]))
+        # أول كلمة مميزة من الاسم بعد تخطي الكلمات العامة (جرير للتسويق -> جرير،
+        # اسواق عبدالله العثيم -> العثيم)
+        if len(words) > 1:
+            for word in words:
+                if word not in _GENERIC_WORDS and len(word) >= _MIN_KEY_LENGTH:
+                    variants.append(word)
+                    break
+        return variants
+
+    def get(self, symbol: str) -> Optional[StockEntry]:
+        return self._entries.get(symbol)
+
+    def symbols(self) -> List[str]:
+        return list(self._entries)
+
+    def resolve(self, text: str, fuzzy=True) -> Optional[str]:
+        key = normalize(text)
+        if not key:
+            return None
+        if key.isdigit():
+            return self._resolve_code(key, bare=True)
+        if key in self._ambiguous or key in _GENERIC_WORDS:
+            return None
+        symbol = self._keys.get(key)
+        if symbol is None and fuzzy:
+            symbol = self._fuzzy(key)
+        return symbol
+
+    def _resolve_code(self, code, bare=False):
+        if code in self._entries:
+            return code
+        # قبل تحميل قائمة الأسهم نكتفي بالتحقق من صيغة الرمز، وفقط إذا كان الرمز هو الرسالة كاملة
+        # (داخل النص قد يكون الرقم سنة أو مبلغاً)
+        if bare and not self._entries and len(code) == 4 and 1000 <= int(code) <= 9999:
+            return code
+        return None
+
+    def complete(self, prefix: str, limit=10) -> List[str]:
+        node = self._trie
+        for ch in normalize(prefix):
+            node = node.get(ch)
+            if node is None:
+                return []
+        found, stack = [], [node]
+        while stack and len(found) < limit:
+            current = stack.pop()
+            for ch, child in current.items():
+                if ch == _END:
+                    if child not in found:
+                        found.append(child)
+                else:
+                    stack.append(child)
+        return found[:limit]
+
+    def find_mentions(self, text: str) -> List[str]:
+        # مسح الرسالة مرة واحدة عبر الشجرة مع تفضيل أطول تطابق ينتهي عند حد كلمة
+        key = normalize(_HASH_CODE.sub(r' رمز \1', text))
+        mentions = []
+        i, n = 0, len(key)
+        previous = None
+        while i < n:
+            if key[i] == ' ':
+                i += 1
+                continue
+            match, match_end = self._match(key, i)
+            if match is None and key[i] == 'و':
+                # واو العطف الملتصقة بالاسم (ارامكو والراجحي)
+                match, match_end = self._match(key, i + 1)
+            if match is None:
+                end = key.find(' ', i)
+                end = n if end == -1 else end
+                word = key[i:end]
+                # الأرقام داخل النص (سنوات، مبالغ) لا تُعد رموزاً إلا بعد كلمة دالة
+                if word.isdigit() and previous in _CODE_MARKERS:
+                    match = self._resolve_code(word)
+                match_end = end
+            if match is not None and match not in mentions:
+                mentions.append(match)
+            previous = key[i:match_end]
+            i = match_end
+        return mentions
+
+    def _match(self, key, i):
+        match, match_end = None, i
+        node, j, n = self._trie, i, len(key)
+        while j < n:
+            node = node.get(key[j])
+            if node is None:
+                break
+            j += 1
+            if _END in node and (j == n or key[j] == ' '):
+                match, match_end = node[_END], j
+        return match, match_end
+
+    def _fuzzy(self, key):
+        if len(key) < _MIN_KEY_LENGTH:
+            return None
+        grams = _trigrams(key)
+        scores = defaultdict(int)
+        for gram in grams:
+            for candidate in self._trigrams.get(gram, ()):
+                scores[candidate] += 1
+        best, best_score = None, 0.0
+        for candidate, shared in scores.items():
+            if len(candidate) < _MIN_KEY_LENGTH:
+                continue
+            score = shared / (len(grams) + self._gram_counts[candidate] - shared)
+            if score > best_score:
+                best, best_score = candidate, score
+        if best is None or best_score < self.fuzzy_threshold:
+            return None
+        return self._keys[best]
+
+stock_index = StockLookupIndex()
@@ -5,7 +5,9 @@ import numpy as np
 import pandas as pd
 from .database import db, Opportunity, StrategyConfig as StrategyConfigDB
 from .technical_analysis import TechnicalAnalyzer
+from .timeframes import TimeframeResampler, BASE_TIMEFRAME
 from .notifications import NotificationManager
+from .outbox import outbox
 
 @dataclass
 class StrategyConfig:
@@ -13,15 +15,18 @@ class StrategyConfig:
     parameters: Dict
     is_active: bool = True
     notification_channel: str = "all"
+    timeframe: str = BASE_TIMEFRAME
 
 class TradingStrategies:
     def __init__(self):
         self.ta = TechnicalAnalyzer()
+        self.timeframes = TimeframeResampler()
         self.notifier = NotificationManager()
         self.strategies = {
             'RSI_OVERBOUGHT': StrategyConfig(
                 name='اختراق RSI الأسبوعي',
-                parameters={'timeframe': '1W', 'threshold': 70}
+                parameters={'threshold': 70},
+                timeframe='1W'
             ),
             'FIBONACCI_BREAKOUT': StrategyConfig(
                 name='اختراق مستويات فيبوناتشي',
@@ -34,51 +39,107 @@ class TradingStrategies:
         }
 
     def detect_opportunities(self, symbol: str, data: pd.DataFrame) -> List[Dict]:
-        opportunities = []
+        return self.save_signals(self.detect_signals(symbol, data))[None]
+
+    def detect_signals(self, symbol: str, data: pd.DataFrame, active=None) -> List[Dict]:
+        # كشف الإشارات فقط دون أي وصول لقاعدة البيانات (يُستخدم أيضاً في عمليات المسح المتوازي)
+        if active is None:
+            active = self.active_strategies()
+        signals = []
         current_price = data['Close'].iloc[-1]
+        # كل استراتيجية تستلم البيانات بإطارها الزمني المعلن، محسوبة مرة واحدة لكل سهم
+        frames = self.timeframes.get_many(
+            symbol, data, [config.timeframe for config in self.strategies.values()]
+        )
         
         # استراتيجية RSI
-        if self._is_strategy_active('RSI_OVERBOUGHT'):
-            rsi = self.ta.calculate_rsi(data, 14)
-            if rsi.iloc[-1] > 70:
+        if 'RSI_OVERBOUGHT' in active:
+            config = self.strategies['RSI_OVERBOUGHT']
+            rsi = self.ta.calculate_rsi(frames[config.timeframe], 14)
+            if rsi.iloc[-1] > config.parameters['threshold']:
                 entry_price = current_price
                 targets = self._calculate_fibonacci_targets(entry_price, data)
-                opportunities.append(self._create_opportunity(
-                    symbol, 'RSI_OVERBOUGHT', entry_price, targets
-                ))
+                signals.append(self._signal(symbol, 'RSI_OVERBOUGHT', entry_price, targets))
 
         # استراتيجية فيبوناتشي
-        if self._is_strategy_active('FIBONACCI_BREAKOUT'):
-            fib_levels = self.ta.calculate_fibonacci_levels(data)
+        if 'FIBONACCI_BREAKOUT' in active:
+            fib_levels = self.ta.calculate_fibonacci_levels(frames[self.strategies['FIBONACCI_BREAKOUT'].timeframe])
             if current_price > fib_levels['61.8%']:
                 targets = {
                     '1': fib_levels['100%'],
                     '2': fib_levels['100%'] + (fib_levels['100%'] - fib_levels['61.8%']),
                     '3': fib_levels['161.8%']
                 }
-                opportunities.append(self._create_opportunity(
-                    symbol, 'FIBONACCI_BREAKOUT', current_price, targets
-                ))
-
-        return opportunities
-
-    def _create_opportunity(self, symbol, strategy_type, entry, targets):
-        opportunity = Opportunity(
-            symbol=symbol,
-            strategy=strategy_type,
-            entry_price=entry,
-            targets=targets,
-            current_target=1,
-            status='active',
-            created_at=datetime.now()
-        )
-        db.session.add(opportunity)
-        db.session.commit()
+                signals.append(self._signal(symbol, 'FIBONACCI_BREAKOUT', current_price, targets))
+
+        # نموذج الرأس والكتفين (المعكوس فقط لأن الأهداف صاعدة)
+        if 'HEAD_SHOULDERS' in active:
+            config = self.strategies['HEAD_SHOULDERS']
+            patterns = self.ta.detect_chart_patterns(
+                frames[config.timeframe], (symbol, config.timeframe),
+                confirmation_candles=config.parameters['confirmation_candles']
+            )
+            for pattern in patterns:
+                if pattern['pattern'] != 'INVERSE_HEAD_SHOULDERS' or not pattern['confirmed']:
+                    continue
+                move = pattern['target'] - pattern['neckline']
+                targets = {
+                    '1': pattern['neckline'] + move * 0.5,
+                    '2': pattern['target'],
+                    '3': pattern['target'] + move * 0.618
+                }
+                signals.append(self._signal(symbol, 'HEAD_SHOULDERS', current_price, targets))
+
+        return signals
+
+    def active_strategies(self):
+        return {strategy_id for strategy_id in self.strategies if self._is_strategy_active(strategy_id)}
+
+    def save_signals(self, signals: List[Dict], chat_ids=(None,)) -> Dict:
+        # فرصة مفتوحة واحدة فقط لكل (مجموعة، سهم، استراتيجية)، والإدراج دفعة واحدة في معاملة واحدة؛
+        # النتيجة {chat_id: الإشارات الجديدة فقط}
+        chat_ids = [str(chat_id) if chat_id is not None else None for chat_id in chat_ids]
+        new = {chat_id: [] for chat_id in chat_ids}
+        if not signals or not chat_ids:
+            return new
+        open_keys = set(db.session.query(Opportunity.chat_id, Opportunity.symbol, Opportunity.strategy).filter(
+            Opportunity.status == 'active',
+            Opportunity.symbol.in_({s['symbol'] for s in signals})
+        ).all())
+        rows = []
+        for chat_id in chat_ids:
+            for signal in signals:
+                key = (chat_id, signal['symbol'], signal['strategy'])
+                if key in open_keys:
+                    continue
+                open_keys.add(key)
+                rows.append(self._opportunity_row(signal, chat_id))
+                new[chat_id].append(signal)
+        if rows:
+            db.session.bulk_insert_mappings(Opportunity, rows)
+            db.session.commit()
+        return new
+
+    def _signal(self, symbol, strategy_type, entry, targets):
         return {
             'symbol': symbol,
             'strategy': strategy_type,
-            'entry_price': entry,
-            'targets': targets
+            'entry_price': float(entry),
+            'targets': {key: float(value) for key, value in targets.items()}
+        }
+
+    def _opportunity_row(self, signal, chat_id=None):
+        return {
+            'chat_id': chat_id,
+            'symbol': signal['symbol'],
+            'strategy': signal['strategy'],
+            'entry_price': signal['entry_price'],
+            'targets': signal['targets'],
+            'current_target': 1,
+            'status': 'active',
+            'entry_date': datetime.now().date(),
+            'achieved_targets': [],
+            'weekly_progress': {}
         }
 
     def _calculate_fibonacci_targets(self, entry, data):
@@ -95,58 +156,79 @@ class TradingStrategies:
         return config.is_active if config else self.strategies.get(strategy_id, False).is_active
 
 class GoalTracker:
-    def __init__(self):
+    def __init__(self, strategies: TradingStrategies, price_source):
+        # price_source: دالة تعيد السعر الحالي للرمز أو None
+        self.strategies = strategies.strategies
+        self.price_source = price_source
         self.notifier = NotificationManager()
 
     def track_goals(self):
-        opportunities = db.session.query(Opportunity).filter_by(status='active').all()
+        opportunities = db.session.query(Opportunity).filter(
+            Opportunity.status == 'active',
+            Opportunity.chat_id.isnot(None)
+        ).all()
+        # سعر واحد لكل سهم في الجولة مهما تعددت المجموعات المتابعة له
+        prices = {}
         for opp in opportunities:
-            current_price = self._get_current_price(opp.symbol)
-            self._check_targets(opp, current_price)
+            if opp.symbol not in prices:
+                prices[opp.symbol] = self._get_current_price(opp.symbol)
+            if prices[opp.symbol] is not None:
+                self._check_targets(opp, prices[opp.symbol])
+        # إرسال ما تجمّع من تحديثات دون انتظار نهاية النافذة
+        outbox.flush_all()
 
     def _get_current_price(self, symbol):
-        # هنا سيكون تنفيذ لجلب السعر الحالي للسهم
-        pass
+        price = self.price_source(symbol)
+        return float(price) if price is not None else None
 
     def _check_targets(self, opp, current_price):
-        targets = opp.targets
-        current_target = f'target{opp.current_target}'
-        
-        if current_price >= targets[current_target]:
-            self._notify_achievement(opp, current_target)
-            self._update_opportunity(opp)
-            
-            if opp.current_target >= len(targets):
-                self._create_new_targets(opp)
-
-    def _notify_achievement(self, opp, target):
+        target = str(opp.current_target)
+        if target not in opp.targets or current_price < opp.targets[target]:
+            return
+        self._notify_achievement(opp, target, current_price)
+        self._update_opportunity(opp, current_price)
+        if opp.status == 'completed':
+            self._create_new_targets(opp, current_price)
+
+    def _notify_achievement(self, opp, target, current_price):
         message = f"🎉 تحقيق الهدف {target} لـ {opp.symbol}\n"
         message += f"الاستراتيجية: {self._get_strategy_name(opp.strategy)}\n"
         message += f"السعر الحالي: {current_price:.2f}"
-        self.notifier.send_goal_alert(opp.chat_id, message)
-
-    def _update_opportunity(self, opp):
+        self.notifier.send_goal_alert(opp.chat_id, message, key=f"{opp.symbol}:goal")
+
+    def _update_opportunity(self, opp, current_price):
+        opp.achieved_targets = (opp.achieved_targets or []) + [{
+            'target': opp.current_target,
+            'price': current_price,
+            'date': datetime.now().strftime('%Y-%m-%d')
+        }]
         opp.current_target += 1
         if opp.current_target > len(opp.targets):
             opp.status = 'completed'
         db.session.commit()
 
-    def _create_new_targets(self, opp):
+    def _create_new_targets(self, opp, current_price):
         new_targets = {
-            '1': opp.entry_price * 1.05,
-            '2': opp.entry_price * 1.08,
-            '3': opp.entry_price * 1.10
+            '1': current_price * 1.05,
+            '2': current_price * 1.08,
+            '3': current_price * 1.10
         }
         new_opp = Opportunity(
+            chat_id=opp.chat_id,
             symbol=opp.symbol,
             strategy=opp.strategy,
+            entry_date=datetime.now().date(),
+            entry_price=current_price,
             targets=new_targets,
             current_target=1,
             status='active'
         )
         db.session.add(new_opp)
         db.session.commit()
-        self.notifier.send_goal_update(opp.chat_id, "تم إنشاء أهداف جديدة 🚀")
+        self.notifier.send_goal_update(
+            opp.chat_id, f"🚀 {opp.symbol}: تم إنشاء أهداف جديدة", key=f"{opp.symbol}:targets"
+        )
 
     def _get_strategy_name(self, strategy_id):
-        return self.strategies.get(strategy_id, {}).get('name', 'Unknown')
\ No newline at end of file
+        config = self.strategies.get(strategy_id)
+        return config.name if config else 'Unknown'
\ No newline at end of file
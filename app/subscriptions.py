@@ -0,0 +1,140 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from cachetools import TTLCache
+from sqlalchemy import update
+from app.database import db, Group, PendingGroup
+from app.notifications import NotificationManager
+from utils.config import Config
+
+class SubscriptionManager:
+    def __init__(self, settings=None):
+        self.settings = settings or Config.SUBSCRIPTION
+        # المجموعات المفعلة: chat_id -> تاريخ انتهاء الاشتراك
+        self._active = {}
+        # المجموعات غير المفعلة تُعاد مراجعتها في قاعدة البيانات بعد مدة قصيرة فقط،
+        # ليظهر أثر موافقة المشرف في جميع العمليات دون استعلام لكل رسالة
+        self._inactive = TTLCache(maxsize=10000, ttl=self.settings['inactive_recheck_seconds'])
+        # المجموعات التي سُجل لها طلب تفعيل في هذه العملية
+        self._registered = set()
+        self._lock = threading.Lock()
+
+    def load(self):
+        now = datetime.now()
+        rows = db.session.query(Group.chat_id, Group.subscription_end).filter(
+            Group.is_active.is_(True),
+            Group.subscription_end > now
+        ).all()
+        with self._lock:
+            self._active = {chat_id: end for chat_id, end in rows}
+            self._inactive.clear()
+        return len(self._active)
+
+    def is_active(self, chat_id):
+        chat_id = str(chat_id)
+        end = self._active.get(chat_id)
+        if end is not None:
+            if end > datetime.now():
+                return True
+            # انتهى التاريخ المحفوظ: قد يكون الاشتراك جُدد من عملية أخرى، فنراجعه مرة واحدة
+            with self._lock:
+                if self._active.get(chat_id) == end:
+                    del self._active[chat_id]
+            return self._recheck(chat_id)
+        if chat_id in self._inactive:
+            return False
+        return self._recheck(chat_id)
+
+    def active_chats(self):
+        now = datetime.now()
+        with self._lock:
+            return [chat_id for chat_id, end in self._active.items() if end > now]
+
+    def _recheck(self, chat_id):
+        group = db.session.query(Group.subscription_end).filter(
+            Group.chat_id == chat_id,
+            Group.is_active.is_(True),
+            Group.subscription_end > datetime.now()
+        ).first()
+        with self._lock:
+            if group is None:
+                self._inactive[chat_id] = True
+                return False
+            self._active[chat_id] = group.subscription_end
+        return True
+
+    def register_pending(self, chat_id, title=None, admin_username=None):
+        # يعيد True عند تسجيل طلب تفعيل جديد
+        chat_id = str(chat_id)
+        if chat_id in self._registered:
+            return False
+        exists = db.session.query(PendingGroup.id).filter_by(chat_id=chat_id).first() or \
+            db.session.query(Group.id).filter_by(chat_id=chat_id).first()
+        if not exists:
+            db.session.add(PendingGroup(chat_id=chat_id, title=title, admin_username=admin_username))
+            db.session.commit()
+        # يُحفظ بعد نجاح الكتابة فقط حتى يُعاد المحاولة إذا تعذر الوصول لقاعدة البيانات
+        self._registered.add(chat_id)
+        return not exists
+
+    def approve(self, chat_id, days=None):
+        chat_id = str(chat_id)
+        end = datetime.now() + timedelta(days=days or self.settings['duration_days'])
+        pending = db.session.query(PendingGroup).filter_by(chat_id=chat_id).first()
+        group = db.session.query(Group).filter_by(chat_id=chat_id).first()
+        if group is None:
+            group = Group(
+                chat_id=chat_id,
+                title=pending.title if pending else None,
+                admin_username=pending.admin_username if pending else None
+            )
+            db.session.add(group)
+        group.is_active = True
+        group.subscription_end = end
+        group.last_reminder = None
+        if pending is not None:
+            db.session.delete(pending)
+        db.session.commit()
+
+        with self._lock:
+            self._active[chat_id] = end
+            self._inactive.pop(chat_id, None)
+        return end
+
+    def sweep(self, send_message):
+        # مسح جماعي واحد: تعطيل المنتهية ثم تذكير القريبة من الانتهاء
+        now = datetime.now()
+        expired = db.session.execute(
+            update(Group)
+            .where(Group.is_active.is_(True), Group.subscription_end <= now)
+            .values(is_active=False)
+        ).rowcount
+
+        reminder_cutoff = now + timedelta(days=self.settings['reminder_days_before'])
+        last_allowed = now - self.settings['reminder_interval']
+        due = db.session.query(Group.id, Group.chat_id).filter(
+            Group.is_active.is_(True),
+            Group.subscription_end > now,
+            Group.subscription_end <= reminder_cutoff,
+            db.or_(Group.last_reminder.is_(None), Group.last_reminder <= last_allowed)
+        ).all()
+
+        reminded = []
+        message = NotificationManager.subscription_reminder()
+        for group_id, chat_id in due:
+            try:
+                send_message(chat_id, message)
+                reminded.append(group_id)
+            except Exception as e:
+                logging.error(f"Subscription reminder error for {chat_id}: {str(e)}")
+
+        if reminded:
+            db.session.execute(
+                update(Group).where(Group.id.in_(reminded)).values(last_reminder=now)
+            )
+        db.session.commit()
+
+        self.load()
+        return {'expired': expired, 'reminded': len(reminded)}
+
+subscriptions = SubscriptionManager()
@@ -0,0 +1,221 @@
+import pandas as pd
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+PIVOT_HIGH = 1
+PIVOT_LOW = -1
+
+class PivotCache:
+    # نقاط الانعكاس لكل سهم؛ النقطة لا تتغير بعد مرور order شمعة على يمينها
+    def __init__(self):
+        self._entries = {}
+
+    def get(self, symbol):
+        return self._entries.get(symbol)
+
+    def put(self, symbol, length, first_label, last_label, last_bar, pivots):
+        self._entries[symbol] = (length, first_label, last_label, last_bar, pivots)
+
+    def clear(self, symbol=None):
+        if symbol is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(symbol, None)
+
+class TechnicalAnalyzer:
+    def __init__(self, pivot_order=3, tolerance=0.03):
+        self.pivot_order = pivot_order
+        self.tolerance = tolerance
+        self.pivot_cache = PivotCache()
+
+    def calculate_rsi(self, data, window=14):
+        delta = data['Close'].diff()
+        gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
+        loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
+        rs = gain / loss
+        return 100 - (100 / (1 + rs))
+
+    def calculate_fibonacci_levels(self, data):
+        high = data['High'].max()
+        low = data['Low'].min()
+        diff = high - low
+
+        return {
+            '23.6%': high - diff * 0.236,
+            '38.2%': high - diff * 0.382,
+            '61.8%': high - diff * 0.618,
+            '100%': high,
+            '161.8%': high + diff * 0.618
+        }
+
+    def find_pivots(self, data, symbol=None):
+        # استخراج القمم والقيعان المحلية، مع إعادة استخدام النتائج المخزنة عند وصول شموع جديدة
+        high = data['High'].to_numpy(dtype=np.float64)
+        low = data['Low'].to_numpy(dtype=np.float64)
+        n = len(high)
+        order = self.pivot_order
+
+        start = 0
+        cached_idx = np.empty(0, dtype=np.int64)
+        cached_kind = np.empty(0, dtype=np.int8)
+        entry = self.pivot_cache.get(symbol) if symbol is not None else None
+        if entry is not None:
+            length, first_label, last_label, last_bar, (idx, kind) = entry
+            # الشموع السابقة لم تتغير (آخر شمعة مخزنة قد تُعدل أثناء التداول فتُقارن قيمها أيضاً):
+            # نعيد حساب كل مركز قد تشمل نافذته آخر شمعة مخزنة، وما قبلها اكتمل فلا يتغير
+            if (n >= length and data.index[0] == first_label and data.index[length - 1] == last_label
+                    and (high[length - 1], low[length - 1]) == last_bar):
+                start = max(0, length - 2 * order)
+                keep = idx < start
+                cached_idx, cached_kind = idx[keep], kind[keep]
+
+        # الذيل يبدأ قبل أول مركز جديد بـ order شمعة حتى تكتمل نافذته اليسرى
+        ext = max(0, start - order)
+        new_idx, new_kind = self._extract_pivots(high[ext:], low[ext:], order)
+        new_idx = new_idx + ext
+        fresh = new_idx >= start
+        idx = np.concatenate([cached_idx, new_idx[fresh]])
+        kind = np.concatenate([cached_kind, new_kind[fresh]])
+
+        if symbol is not None and n:
+            self.pivot_cache.put(symbol, n, data.index[0], data.index[-1], (high[-1], low[-1]), (idx, kind))
+        return idx, kind
+
+    def _extract_pivots(self, high, low, order):
+        window = 2 * order + 1
+        if len(high) < window:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int8)
+        centers = np.arange(order, len(high) - order)
+        is_high = high[centers] == sliding_window_view(high, window).max(axis=1)
+        is_low = low[centers] == sliding_window_view(low, window).min(axis=1)
+
+        idx = np.concatenate([centers[is_high], centers[is_low]])
+        kind = np.concatenate([
+            np.full(is_high.sum(), PIVOT_HIGH, dtype=np.int8),
+            np.full(is_low.sum(), PIVOT_LOW, dtype=np.int8)
+        ])
+        order_by = np.lexsort((kind, idx))
+        return idx[order_by], kind[order_by]
+
+    def zigzag(self, data, idx, kind):
+        # تصفية النقاط إلى تسلسل متناوب (قمة/قاع) بتجاهل الحركات الأصغر من نسبة التسامح
+        high = data['High'].to_numpy(dtype=np.float64)
+        low = data['Low'].to_numpy(dtype=np.float64)
+        swings = []
+        for i, k in zip(idx.tolist(), kind.tolist()):
+            price = high[i] if k == PIVOT_HIGH else low[i]
+            if swings and swings[-1][1] == k:
+                # نقطتان من النوع نفسه: نحتفظ بالأكثر تطرفاً
+                if (k == PIVOT_HIGH and price > swings[-1][2]) or (k == PIVOT_LOW and price < swings[-1][2]):
+                    swings[-1] = (i, k, price)
+                continue
+            if swings and abs(price - swings[-1][2]) / swings[-1][2] < self.tolerance:
+                continue
+            swings.append((i, k, price))
+        return swings
+
+    def detect_chart_patterns(self, data, symbol=None, confirmation_candles=3):
+        # منطق كشف النماذج الفنية
+        patterns = []
+        if len(data) < 2 * self.pivot_order + 1:
+            return patterns
+        idx, kind = self.find_pivots(data, symbol)
+        swings = self.zigzag(data, idx, kind)
+        close = data['Close'].to_numpy(dtype=np.float64)
+
+        for matcher in (self._match_head_shoulders, self._match_double, self._match_triangle):
+            pattern = matcher(swings, close, confirmation_candles)
+            if pattern:
+                patterns.append(pattern)
+        return patterns
+
+    def _confirmed(self, close, after, level, bearish, candles):
+        # التأكيد: آخر N شموع بعد النموذج أغلقت خلف خط العنق
+        tail = close[after + 1:]
+        if len(tail) < candles:
+            return False
+        tail = tail[-candles:]
+        return bool((tail < level).all() if bearish else (tail > level).all())
+
+    def _similar(self, a, b):
+        return abs(a - b) / max(a, b) <= self.tolerance
+
+    def _match_head_shoulders(self, swings, close, candles):
+        if len(swings) < 5:
+            return None
+        (i1, k1, p1), (i2, _, p2), (i3, _, p3), (i4, _, p4), (i5, _, p5) = swings[-5:]
+        bearish = k1 == PIVOT_HIGH
+        if bearish:
+            valid = p3 > p1 and p3 > p5 and self._similar(p1, p5)
+        else:
+            valid = p3 < p1 and p3 < p5 and self._similar(p1, p5)
+        if not valid:
+            return None
+
+        # خط العنق بين القاعين (أو القمتين في النموذج المعكوس) ممتد حتى آخر شمعة
+        slope = (p4 - p2) / (i4 - i2)
+        neckline = p4 + slope * (len(close) - 1 - i4)
+        height = abs(p3 - (p2 + slope * (i3 - i2)))
+        return {
+            'pattern': 'HEAD_SHOULDERS' if bearish else 'INVERSE_HEAD_SHOULDERS',
+            'direction': 'bearish' if bearish else 'bullish',
+            'neckline': float(neckline),
+            'target': float(neckline - height if bearish else neckline + height),
+            'confirmed': self._confirmed(close, i5, neckline, bearish, candles),
+            'pivots': [i1, i2, i3, i4, i5]
+        }
+
+    def _match_double(self, swings, close, candles):
+        if len(swings) < 3:
+            return None
+        (i1, k1, p1), (i2, _, p2), (i3, _, p3) = swings[-3:]
+        if not self._similar(p1, p3):
+            return None
+        bearish = k1 == PIVOT_HIGH
+        height = abs(max(p1, p3) - p2) if bearish else abs(p2 - min(p1, p3))
+        return {
+            'pattern': 'DOUBLE_TOP' if bearish else 'DOUBLE_BOTTOM',
+            'direction': 'bearish' if bearish else 'bullish',
+            'neckline': float(p2),
+            'target': float(p2 - height if bearish else p2 + height),
+            'confirmed': self._confirmed(close, i3, p2, bearish, candles),
+            'pivots': [i1, i2, i3]
+        }
+
+    def _match_triangle(self, swings, close, candles):
+        if len(swings) < 5:
+            return None
+        recent = swings[-6:]
+        highs = np.array([(i, p) for i, k, p in recent if k == PIVOT_HIGH], dtype=np.float64)
+        lows = np.array([(i, p) for i, k, p in recent if k == PIVOT_LOW], dtype=np.float64)
+        if len(highs) < 2 or len(lows) < 2:
+            return None
+
+        # الميل كنسبة من السعر لكل شمعة حتى يكون المعيار مستقلاً عن مستوى السعر
+        high_slope = np.polyfit(highs[:, 0], highs[:, 1], 1)[0] / highs[:, 1].mean()
+        low_slope = np.polyfit(lows[:, 0], lows[:, 1], 1)[0] / lows[:, 1].mean()
+        flat = self.tolerance / 10
+
+        if high_slope < -flat and low_slope > flat:
+            name, direction = 'SYMMETRICAL_TRIANGLE', 'neutral'
+        elif abs(high_slope) <= flat and low_slope > flat:
+            name, direction = 'ASCENDING_TRIANGLE', 'bullish'
+        elif high_slope < -flat and abs(low_slope) <= flat:
+            name, direction = 'DESCENDING_TRIANGLE', 'bearish'
+        else:
+            return None
+
+        last = len(close) - 1
+        upper = np.polyval(np.polyfit(highs[:, 0], highs[:, 1], 1), last)
+        lower = np.polyval(np.polyfit(lows[:, 0], lows[:, 1], 1), last)
+        bearish = direction == 'bearish'
+        breakout = lower if bearish else upper
+        height = highs[:, 1].max() - lows[:, 1].min()
+        return {
+            'pattern': name,
+            'direction': direction,
+            'neckline': float(breakout),
+            'target': float(breakout - height if bearish else breakout + height),
+            'confirmed': self._confirmed(close, int(recent[-1][0]), breakout, bearish, candles),
+            'pivots': [i for i, _, _ in recent]
+        }
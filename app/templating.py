@@ -0,0 +1,110 @@
+import os
+import html
+import threading
+from string import Formatter
+from cachetools import LRUCache
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
+DEFAULT_LOCALE = 'ar'
+
+# الرموز الخاصة في تنسيقات تيليجرام
+_MARKDOWN_SPECIAL = '_*`['
+_MARKDOWN_V2_SPECIAL = '\\_*[]()~`>#+-=|{}.!'
+
+def escape_markdown(text, version=1):
+    special = _MARKDOWN_V2_SPECIAL if version == 2 else _MARKDOWN_SPECIAL
+    return ''.join('\\' + ch if ch in special else ch for ch in text)
+
+def escape_html(text):
+    return html.escape(text, quote=False)
+
+_ESCAPERS = {
+    'Markdown': escape_markdown,
+    'MarkdownV2': lambda text: escape_markdown(text, version=2),
+    'HTML': escape_html,
+    None: lambda text: text
+}
+
+class Raw(str):
+    # نص جاهز (مثل ناتج قالب آخر) لا يُعاد تهريبه
+    pass
+
+class CompiledTemplate:
+    def __init__(self, name, source):
+        self.name = name
+        # تحليل القالب مرة واحدة إلى مقاطع ثابتة وحقول
+        self._parts = [
+            (literal, field, spec or '', conversion)
+            for literal, field, spec, conversion in Formatter().parse(source)
+        ]
+
+    def render(self, escape, context):
+        out = []
+        for literal, field, spec, conversion in self._parts:
+            out.append(literal)
+            if field is None:
+                continue
+            value = context[field]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 's':
+                value = str(value)
+            text = format(value, spec)
+            out.append(text if isinstance(value, Raw) else escape(text))
+        return ''.join(out)
+
+class TemplateEngine:
+    def __init__(self, templates_dir=TEMPLATES_DIR, default_locale=DEFAULT_LOCALE, cache_size=256):
+        self.templates_dir = templates_dir
+        self.default_locale = default_locale
+        self._compiled = {}
+        self._rendered = LRUCache(maxsize=cache_size)
+        self._lock = threading.Lock()
+        self._load_all()
+
+    def _load_all(self):
+        # القوالب في جذر المجلد تخص اللغة الافتراضية، والمجلدات الفرعية للغات الأخرى
+        for entry in os.listdir(self.templates_dir):
+            path = os.path.join(self.templates_dir, entry)
+            if os.path.isdir(path):
+                for name in os.listdir(path):
+                    self._compile(entry, name, os.path.join(path, name))
+            else:
+                self._compile(self.default_locale, entry, path)
+
+    def _compile(self, locale, name, path):
+        with open(path, encoding='utf-8') as template_file:
+            source = template_file.read()
+        # حذف سطر النهاية الأخير فقط للحفاظ على الأسطر الفارغة المقصودة
+        if source.endswith('\n'):
+            source = source[:-1]
+        self._compiled[(locale, name)] = CompiledTemplate(name, source)
+
+    def get(self, name, locale=None):
+        locale = locale or self.default_locale
+        template = self._compiled.get((locale, name)) or self._compiled.get((self.default_locale, name))
+        if template is None:
+            raise KeyError(f"Template not found: {name}")
+        return template
+
+    def render(self, name, parse_mode='Markdown', locale=None, **context):
+        return Raw(self.get(name, locale).render(_ESCAPERS[parse_mode], context))
+
+    def render_many(self, name, items, parse_mode='Markdown', locale=None, separator='\n'):
+        template = self.get(name, locale)
+        escape = _ESCAPERS[parse_mode]
+        return Raw(separator.join(template.render(escape, item) for item in items))
+
+    def render_shared(self, name, parse_mode='Markdown', locale=None, **context):
+        # للرسائل المتطابقة لجميع المستلمين: تُنسّق مرة واحدة ويُعاد استخدام الناتج
+        key = (locale or self.default_locale, name, parse_mode, tuple(sorted(context.items())))
+        with self._lock:
+            cached = self._rendered.get(key)
+        if cached is not None:
+            return cached
+        rendered = self.render(name, parse_mode=parse_mode, locale=locale, **context)
+        with self._lock:
+            self._rendered[key] = rendered
+        return rendered
+
+templates = TemplateEngine()
@@ -0,0 +1,99 @@
+import threading
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+from utils.config import Config
+
+# أسبوع تداول من الأحد إلى الخميس: الشمعة الأسبوعية تنتهي يوم الخميس
+TIMEFRAME_RULES = {
+    '15m': '15min',
+    '30m': '30min',
+    '1H': 'h',
+    '1D': 'D',
+    '1W': 'W-THU',
+    '1M': 'ME'
+}
+# الأسبوع والشهر تُسمى شموعهما بنهاية الفترة وتشملها، والأطر اللحظية ببدايتها
+RIGHT_LABELLED = {'1W', '1M'}
+BASE_TIMEFRAME = '1D'
+
+OHLCV_AGG = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Adj Close': 'last',
+    'Volume': 'sum'
+}
+
+class TimeframeResampler:
+    def __init__(self, timezone=Config.MARKET_TIMEZONE):
+        self.timezone = timezone
+        # (symbol, timeframe) -> (الشموع المجمعة، عدد الشموع الأساسية، أول وآخر تاريخ)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get(self, symbol, data, timeframe):
+        if timeframe == BASE_TIMEFRAME or timeframe not in TIMEFRAME_RULES:
+            return data
+        if data.empty:
+            return data
+        data = self._localize(data)
+        key = (symbol, timeframe)
+
+        with self._lock:
+            entry = self._cache.get(key)
+        resampled = None
+        if entry is not None:
+            resampled = self._update(entry, data, timeframe)
+        if resampled is None:
+            resampled = self._resample(data, timeframe)
+
+        with self._lock:
+            self._cache[key] = (resampled, len(data), data.index[0], data.index[-1])
+        return resampled
+
+    def get_many(self, symbol, data, timeframes):
+        # كل إطار زمني يُحسب مرة واحدة لكل سهم وتتشاركه الاستراتيجيات
+        return {tf: self.get(symbol, data, tf) for tf in set(timeframes)}
+
+    def invalidate(self, symbol=None):
+        with self._lock:
+            if symbol is None:
+                self._cache.clear()
+            else:
+                for key in [k for k in self._cache if k[0] == symbol]:
+                    del self._cache[key]
+
+    def _update(self, entry, data, timeframe):
+        resampled, length, first_label, last_label = entry
+        # التحديث التدريجي ممكن فقط إذا كانت البيانات امتداداً لما سبق
+        if len(data) < length or data.index[0] != first_label or data.index[length - 1] != last_label:
+            return None
+        if len(resampled) < 2:
+            return None
+        # الشموع المغلقة تبقى كما هي، ويُعاد حساب آخر شمعة مفتوحة وما بعدها دائماً حتى
+        # مع ثبات عدد الشموع، لأن آخر شمعة أساسية قد تُعدل أثناء التداول
+        closed = resampled.iloc[:-1]
+        # الذيل يبدأ عند الحد الأيمن لآخر شمعة مغلقة: pandas يمد الشموع الأسبوعية والشهرية
+        # حتى نهاية يوم التسمية، والأطر اللحظية تنتهي عند التسمية + طول الفترة
+        last = closed.index[-1]
+        if timeframe in RIGHT_LABELLED:
+            edge = last + pd.Timedelta(days=1)
+        else:
+            edge = last + to_offset(TIMEFRAME_RULES[timeframe])
+        tail = data[data.index >= edge]
+        return pd.concat([closed, self._resample(tail, timeframe)])
+
+    def _resample(self, data, timeframe):
+        agg = {col: how for col, how in OHLCV_AGG.items() if col in data.columns}
+        side = 'right' if timeframe in RIGHT_LABELLED else 'left'
+        resampled = data.resample(TIMEFRAME_RULES[timeframe], closed=side, label=side).agg(agg)
+        # حذف الفترات الخالية من التداول (العطل ونهاية الأسبوع)
+        return resampled.dropna(subset=['Close']) if 'Close' in resampled else resampled
+
+    def _localize(self, data):
+        if not isinstance(data.index, pd.DatetimeIndex):
+            return data
+        if data.index.tz is None:
+            return data.tz_localize(self.timezone)
+        return data.tz_convert(self.timezone)
@@ -0,0 +1,259 @@
+import atexit
+import logging
+import threading
+from contextlib import nullcontext
+from datetime import datetime
+from sqlalchemy import update, bindparam, case, literal_column
+from app.database import db, ContentRegistry, UserLimit, GroupSettings
+from utils.config import Config
+
+def _dialect_insert(dialect):
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+        return insert
+    if dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+        return insert
+    return None
+
+# دمج related_groups داخل قاعدة البيانات (اتحاد بلا تكرار) حتى لا تُسقط عمليتان
+# تكتبان المحتوى نفسه في الوقت ذاته مجموعات بعضهما
+_MERGE_GROUPS_SQL = {
+    'postgresql': (
+        "COALESCE((SELECT json_agg(g ORDER BY g) FROM ("
+        "SELECT json_array_elements_text(COALESCE(content_registry.related_groups, '[]'::json)) AS g "
+        "UNION SELECT json_array_elements_text(excluded.related_groups)) AS merged), '[]'::json)"
+    ),
+    'sqlite': (
+        "(SELECT json_group_array(value) FROM ("
+        "SELECT value FROM json_each(COALESCE(content_registry.related_groups, '[]')) "
+        "UNION SELECT value FROM json_each(excluded.related_groups) ORDER BY value))"
+    )
+}
+
+class WriteBehindLogger:
+    # يجمع أحداث السجلات في الذاكرة ويكتبها على دفعات خارج مسار الرد
+    def __init__(self, settings=None):
+        self.settings = settings or Config.WRITE_BEHIND
+        self._content = {}
+        self._usage = {}
+        self._activity = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._app = None
+
+    def start(self, app):
+        if self._thread is not None:
+            return
+        self._app = app
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def shutdown(self):
+        # إيقاف الخيط ثم تفريغ ما تبقى قبل إنهاء العملية
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout=self.settings['flush_interval'] * 2)
+        self._thread = None
+        self.flush()
+
+    # ----------------------
+    # تسجيل الأحداث (بدون أي وصول لقاعدة البيانات)
+    # ----------------------
+    def record_content(self, content_hash, content_type, chat_id=None, at=None):
+        at = at or datetime.now()
+        with self._lock:
+            entry = self._content.get(content_hash)
+            if entry is not None and at - entry['last_sent'] > Config.DUPLICATION_RULES['time_window']:
+                # العداد يحسب الإرسالات داخل نافذة التكرار فقط؛ فجوة أطول منها تبدأ عداً جديداً
+                entry.update(first_sent=at, count=0)
+            if entry is None:
+                entry = self._content[content_hash] = {
+                    'content_type': content_type,
+                    'first_sent': at,
+                    'last_sent': at,
+                    'count': 0,
+                    'groups': set()
+                }
+            entry['count'] += 1
+            entry['last_sent'] = max(entry['last_sent'], at)
+            if chat_id is not None:
+                entry['groups'].add(str(chat_id))
+        self._maybe_wake()
+
+    def record_usage(self, user_id, at=None):
+        at = at or datetime.now()
+        with self._lock:
+            entry = self._usage.setdefault(str(user_id), {'count': 0, 'last': at})
+            entry['count'] += 1
+            entry['last'] = max(entry['last'], at)
+        self._maybe_wake()
+
+    def record_activity(self, chat_id, at=None):
+        at = at or datetime.now()
+        with self._lock:
+            self._activity[str(chat_id)] = at
+        self._maybe_wake()
+
+    def pending_content(self, content_hash):
+        # عدد مرات الإرسال التي لم تُكتب بعد (لفحص التكرار)
+        with self._lock:
+            entry = self._content.get(content_hash)
+            return (entry['count'], entry['last_sent']) if entry else (0, None)
+
+    def _size(self):
+        return len(self._content) + len(self._usage) + len(self._activity)
+
+    def _maybe_wake(self):
+        if self._size() >= self.settings['max_batch']:
+            self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.settings['flush_interval'])
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.flush()
+
+    # ----------------------
+    # الكتابة على دفعات
+    # ----------------------
+    def flush(self):
+        with self._lock:
+            content, self._content = self._content, {}
+            usage, self._usage = self._usage, {}
+            activity, self._activity = self._activity, {}
+        if not (content or usage or activity):
+            return
+
+        # كل نوع في معاملة مستقلة حتى لا يعطل صف فاسد في أحدها كتابة البقية
+        with self._app.app_context() if self._app is not None else nullcontext():
+            try:
+                insert = _dialect_insert(db.engine.dialect.name)
+            except Exception as e:
+                logging.error(f"Write-behind flush error: {str(e)}")
+                self._requeue(content, usage, activity)
+                return
+            if content:
+                self._commit('content', self._write_content, content, insert)
+            if usage:
+                self._commit('usage', self._write_usage, usage, insert)
+            if activity:
+                self._commit('activity', self._write_activity, activity)
+
+    def _commit(self, kind, write, batch, *args):
+        try:
+            write(batch, *args)
+            db.session.commit()
+        except Exception as e:
+            logging.error(f"Write-behind {kind} flush error: {str(e)}")
+            db.session.rollback()
+            self._requeue(**{kind: batch})
+
+    def _write_activity(self, activity):
+        # تحديث على مستوى الجدول (executemany) لكل مجموعة بتاريخ نشاطها
+        table = GroupSettings.__table__
+        db.session.execute(
+            update(table)
+            .where(table.c.chat_id == bindparam('cid'))
+            .values(last_active=bindparam('ts')),
+            [{'cid': chat_id, 'ts': at} for chat_id, at in activity.items()]
+        )
+
+    def _write_content(self, content, insert):
+        rows = [
+            {
+                'id': content_hash,
+                'content_type': entry['content_type'],
+                'first_sent': entry['first_sent'],
+                'last_sent': entry['last_sent'],
+                'sent_count': entry['count'],
+                'related_groups': sorted(entry['groups'])
+            }
+            for content_hash, entry in content.items()
+        ]
+        if insert is None:
+            for row in rows:
+                self._merge_content(row)
+            return
+        stmt = insert(ContentRegistry)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[ContentRegistry.id],
+            set_={
+                # آخر إرسال مسجل خارج نافذة التكرار: يبدأ العد من جديد بدلاً من الإضافة
+                'sent_count': case(
+                    (ContentRegistry.last_sent < self._window_start(), stmt.excluded.sent_count),
+                    else_=ContentRegistry.sent_count + stmt.excluded.sent_count
+                ),
+                'last_sent': stmt.excluded.last_sent,
+                'related_groups': literal_column(_MERGE_GROUPS_SQL[db.engine.dialect.name])
+            }
+        ), rows)
+
+    def _merge_content(self, row):
+        record = db.session.get(ContentRegistry, row['id'])
+        if record is None:
+            db.session.add(ContentRegistry(**row))
+            return
+        if record.last_sent is None or record.last_sent < self._window_start():
+            record.sent_count = row['sent_count']
+        else:
+            record.sent_count = (record.sent_count or 0) + row['sent_count']
+        record.last_sent = row['last_sent']
+        record.related_groups = sorted(set(record.related_groups or []) | set(row['related_groups']))
+
+    def _window_start(self):
+        return datetime.now() - Config.DUPLICATION_RULES['time_window']
+
+    def _write_usage(self, usage, insert):
+        rows = [
+            {'user_id': user_id, 'request_count': entry['count'], 'last_request': entry['last']}
+            for user_id, entry in usage.items()
+        ]
+        if insert is None:
+            for row in rows:
+                record = db.session.get(UserLimit, row['user_id'])
+                if record is None:
+                    db.session.add(UserLimit(**row))
+                else:
+                    record.request_count = (record.request_count or 0) + row['request_count']
+                    record.last_request = row['last_request']
+            return
+        stmt = insert(UserLimit)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[UserLimit.user_id],
+            set_={
+                'request_count': UserLimit.request_count + stmt.excluded.request_count,
+                'last_request': stmt.excluded.last_request
+            }
+        ), rows)
+
+    def _requeue(self, content=None, usage=None, activity=None):
+        # إعادة الأحداث غير المكتوبة إلى الذاكرة لتُكتب في الدفعة التالية
+        with self._lock:
+            for content_hash, entry in (content or {}).items():
+                current = self._content.get(content_hash)
+                if current is None:
+                    self._content[content_hash] = entry
+                    continue
+                current['count'] += entry['count']
+                current['first_sent'] = min(current['first_sent'], entry['first_sent'])
+                current['last_sent'] = max(current['last_sent'], entry['last_sent'])
+                current['groups'] |= entry['groups']
+            for user_id, entry in (usage or {}).items():
+                current = self._usage.get(user_id)
+                if current is None:
+                    self._usage[user_id] = entry
+                    continue
+                current['count'] += entry['count']
+                current['last'] = max(current['last'], entry['last'])
+            for chat_id, at in (activity or {}).items():
+                self._activity[chat_id] = max(self._activity.get(chat_id, at), at)
+
+write_behind = WriteBehindLogger()
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+import pytest
+from app.stock_index import StockLookupIndex, normalize
+
+STOCKS = [
+    ('1120', 'مصرف الراجحي', 'البنوك'),
+    ('1180', 'البنك الأهلي السعودي', 'البنوك'),
+    ('2010', 'الشركة السعودية للصناعات الأساسية', 'المواد الأساسية'),
+    ('2020', 'سابك للمغذيات الزراعية', 'المواد الأساسية'),
+    ('2030', 'المصافي العربية السعودية', 'الطاقة'),
+    ('2222', 'أرامكو السعودية', 'الطاقة'),
+    ('3010', 'أسمنت العربية', 'المواد الأساسية'),
+    ('3020', 'أسمنت اليمامة', 'المواد الأساسية'),
+    ('4001', 'أسواق عبدالله العثيم', 'تجزئة السلع الاستهلاكية'),
+    ('4190', 'جرير للتسويق', 'تجزئة السلع الكمالية'),
+    ('7010', 'الاتصالات السعودية', 'الاتصالات')
+]
+
+@pytest.fixture
+def index():
+    index = StockLookupIndex()
+    index.load([SimpleNamespace(symbol=s, name=n, sector=sec) for s, n, sec in STOCKS])
+    return index
+
+def test_normalize_unifies_letters_and_digits():
+    assert normalize('أَرَامْكُو') == 'ارامكو'
+    assert normalize('٢٢٢٢') == '2222'
+
+@pytest.mark.parametrize('text, symbol', [
+    ('2222', '2222'),
+    ('٢٢٢٢', '2222'),
+    ('ارامكو', '2222'),
+    ('الراجحي', '1120'),
+    ('جرير', '4190'),
+    ('العثيم', '4001'),
+    ('اسمنت اليمامه', '3020')
+])
+def test_resolve(index, text, symbol):
+    assert index.resolve(text) == symbol
+
+@pytest.mark.parametrize('text', ['السعوديه', 'السعودية', 'اسواق', 'اسمنت', '9999', 'رؤية 2030', 'في 2020'])
+def test_resolve_rejects_generic_and_ambiguous(index, text):
+    assert index.resolve(text) is None
+
+@pytest.mark.parametrize('text, mentions', [
+    ('رؤية 2030', []),
+    ('في 2020 كان السوق', []),
+    ('ارباح عام 2024', []),
+    ('اسواق اليوم هادئة', []),
+    ('السعودية تعلن الميزانية', []),
+    ('ما رأيكم في سهم 2222 اليوم', ['2222']),
+    ('رمز ٤١٩٠ و #2030', ['4190', '2030']),
+    ('ارامكو والراجحي ارتفعا', ['2222', '1120']),
+    ('توقعات جرير للتسويق', ['4190'])
+])
+def test_find_mentions(index, text, mentions):
+    assert index.find_mentions(text) == mentions
+
+def test_aliases_only_for_loaded_symbols():
+    index = StockLookupIndex()
+    index.load([SimpleNamespace(symbol=s, name=n, sector=sec) for s, n, sec in STOCKS if s != '1180'])
+    assert index.resolve('المراعي') is None
+    assert index.resolve('1180') is None
+    assert index.find_mentions('الاهلي فاز اليوم') == []
+
+def test_bare_code_fallback_before_load():
+    index = StockLookupIndex()
+    assert index.resolve('2222') == '2222'
+    assert index.find_mentions('ارباح عام 2024') == []
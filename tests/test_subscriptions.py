@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta
+import pytest
+from flask import Flask
+from app.database import db, Group
+from app.outbox import run_sync
+from app.subscriptions import SubscriptionManager
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+def test_sweep_stamps_only_delivered_reminders(app):
+    now = datetime.now()
+    db.session.add_all([
+        Group(chat_id='-1', is_active=True, subscription_end=now + timedelta(days=1)),
+        Group(chat_id='-2', is_active=True, subscription_end=now + timedelta(days=2)),
+        Group(chat_id='-3', is_active=True, subscription_end=now - timedelta(days=1))
+    ])
+    db.session.commit()
+
+    async def send_message(chat_id):
+        if chat_id == '-2':
+            raise ConnectionError('chat unreachable')
+
+    # المرسل غير متزامن مثل Bot.send_message: الخطأ يظهر فقط عند تنفيذ الـ coroutine
+    result = SubscriptionManager().sweep(lambda chat_id, message: run_sync(send_message(chat_id)))
+
+    assert result == {'expired': 1, 'reminded': 1}
+    reminders = dict(db.session.query(Group.chat_id, Group.last_reminder).all())
+    assert reminders['-1'] is not None
+    assert reminders['-2'] is None
+    assert reminders['-3'] is None
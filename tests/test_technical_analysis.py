@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.technical_analysis import TechnicalAnalyzer
+
+def _frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    return pd.DataFrame({
+        'Open': close,
+        'High': close + rng.uniform(0, 1, n),
+        'Low': close - rng.uniform(0, 1, n),
+        'Close': close,
+        'Volume': rng.uniform(1e5, 1e6, n)
+    }, index=pd.date_range('2024-01-01', periods=n, freq='D'))
+
+@pytest.mark.parametrize('order', [1, 3, 5])
+@pytest.mark.parametrize('step', [1, 2, 7])
+def test_incremental_pivots_match_full_recompute(order, step):
+    data = _frame(250, seed=order * 10 + step)
+    incremental = TechnicalAnalyzer(pivot_order=order)
+    full = TechnicalAnalyzer(pivot_order=order)
+
+    for end in range(2 * order, len(data) + 1, step):
+        window = data.iloc[:end]
+        idx, kind = incremental.find_pivots(window, symbol='2222')
+        expected_idx, expected_kind = full.find_pivots(window)
+        np.testing.assert_array_equal(idx, expected_idx)
+        np.testing.assert_array_equal(kind, expected_kind)
+
+def test_pivot_cache_discarded_when_history_changes():
+    data = _frame(120)
+    analyzer = TechnicalAnalyzer()
+    analyzer.find_pivots(data.iloc[:100], symbol='2222')
+
+    # نافذة منزاحة: أول شمعة تغيرت فيُعاد الحساب كاملاً
+    shifted = data.iloc[10:]
+    idx, kind = analyzer.find_pivots(shifted, symbol='2222')
+    expected_idx, expected_kind = TechnicalAnalyzer().find_pivots(shifted)
+    np.testing.assert_array_equal(idx, expected_idx)
+    np.testing.assert_array_equal(kind, expected_kind)
+
+@pytest.mark.parametrize('order', [1, 3])
+@pytest.mark.parametrize('column, value', [('High', 1000.0), ('Low', 1.0)])
+def test_revised_last_bar_refreshes_cached_pivots(order, column, value):
+    data = _frame(80, seed=order)
+    analyzer = TechnicalAnalyzer(pivot_order=order)
+    analyzer.find_pivots(data.iloc[:60], symbol='2222')
+
+    # آخر شمعة مخزنة عُدلت ثم وصلت شموع جديدة: النقاط التي شملتها نافذتها تتغير
+    revised = data.copy()
+    revised.iloc[59, revised.columns.get_loc(column)] = value
+    for end in (60, 61, 60 + order, 80):
+        window = revised.iloc[:end]
+        idx, kind = analyzer.find_pivots(window, symbol='2222')
+        expected_idx, expected_kind = TechnicalAnalyzer(pivot_order=order).find_pivots(window)
+        np.testing.assert_array_equal(idx, expected_idx)
+        np.testing.assert_array_equal(kind, expected_kind)
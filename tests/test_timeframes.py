@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.timeframes import TimeframeResampler, TIMEFRAME_RULES
+
+def _bars(periods, freq, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range('2024-01-07 10:00', periods=periods, freq=freq, tz='Asia/Riyadh')
+    close = 100 + np.cumsum(rng.normal(0, 1, periods))
+    return pd.DataFrame({
+        'Open': close,
+        'High': close + 1,
+        'Low': close - 1,
+        'Close': close,
+        'Volume': rng.uniform(1e5, 1e6, periods)
+    }, index=index)
+
+@pytest.mark.parametrize('timeframe, base_freq', [
+    ('15m', '5min'), ('30m', '5min'), ('1H', '5min'), ('1W', 'D'), ('1M', 'D')
+])
+def test_incremental_resample_matches_full(timeframe, base_freq):
+    data = _bars(400, base_freq)
+    incremental = TimeframeResampler()
+
+    for end in range(50, len(data) + 1, 13):
+        window = data.iloc[:end]
+        result = incremental.get('2222', window, timeframe)
+        expected = TimeframeResampler().get('2222', window, timeframe)
+        pd.testing.assert_frame_equal(result, expected, check_freq=False)
+
+def test_timeframe_rules_are_valid_offsets():
+    for rule in TIMEFRAME_RULES.values():
+        pd.tseries.frequencies.to_offset(rule)
+
+@pytest.mark.parametrize('timeframe, base_freq', [('1H', '5min'), ('1W', 'D'), ('1M', 'D')])
+def test_revised_last_bar_updates_open_candle(timeframe, base_freq):
+    data = _bars(120, base_freq)
+    resampler = TimeframeResampler()
+    resampler.get('2222', data, timeframe)
+
+    # نفس عدد الشموع لكن آخر شمعة عُدلت قيمها
+    revised = data.copy()
+    revised.iloc[-1, revised.columns.get_loc('High')] = 10000
+    result = resampler.get('2222', revised, timeframe)
+    expected = TimeframeResampler().get('2222', revised, timeframe)
+    assert result['High'].iloc[-1] == 10000
+    pd.testing.assert_frame_equal(result, expected, check_freq=False)
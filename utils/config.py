@@ -50,7 +50,8 @@ class Config:
     
     DUPLICATION_RULES = {
         'time_window': timedelta(hours=6),
-        'similarity_threshold': 0.85
+        'similarity_threshold': 0.85,
+        'allowed_repeats': 3
     }
     
     # ----------------------
@@ -76,7 +77,54 @@ class Config:
     PERFORMANCE = {
         'max_threads': 4,
         'request_timeout': 15,
-        'cache_ttl': 300
+        'cache_ttl': 300,
+        # عدد عمليات المسح المتوازي (None = عدد أنوية المعالج)
+        'scan_workers': None
+    }
+
+    # ----------------------
+    # إعدادات الاشتراكات
+    # ----------------------
+    SUBSCRIPTION = {
+        'duration_days': 30,
+        'reminder_days_before': 3,
+        'reminder_interval': timedelta(days=1),
+        'inactive_recheck_seconds': 30
+    }
+
+    # ----------------------
+    # إعدادات تجميع الرسائل الصادرة
+    # ----------------------
+    OUTBOX = {
+        'window_seconds': 10,
+        'max_batch': 20,
+        'max_length': 3500,
+        'max_status_lines': 30
+    }
+
+    # ----------------------
+    # إعدادات الاحتفاظ بالبيانات
+    # ----------------------
+    RETENTION = {
+        'batch_size': 1000,
+        'batch_pause_seconds': 0.05,
+        'archive_completed_after': timedelta(days=30),
+        'partition_months_ahead': 2,
+        'tables': {
+            'content_registry': timedelta(days=30),
+            'global_events': timedelta(days=90),
+            'cached_data': timedelta(0),
+            'opportunities_archive': timedelta(days=730),
+            'price_history': timedelta(days=1825)
+        }
+    }
+
+    # ----------------------
+    # إعدادات الكتابة المؤجلة للسجلات
+    # ----------------------
+    WRITE_BEHIND = {
+        'max_batch': 200,
+        'flush_interval': 5
     }
 
     # ----------------------
@@ -1,12 +1,16 @@
 from app.database import db, ContentRegistry
+from app.write_behind import write_behind
 from utils.config import Config
 from datetime import datetime
 
 def is_duplicate(content_hash):
+    # احتساب الإرسالات داخل نافذة التكرار فقط، بما فيها التي لم تُكتب بعد في قاعدة البيانات
+    window_start = datetime.now() - Config.DUPLICATION_RULES['time_window']
+    pending_count, pending_last = write_behind.pending_content(content_hash)
     existing = db.session.query(ContentRegistry).get(content_hash)
-    if existing:
-        time_diff = datetime.now() - existing.last_sent
-        if time_diff < Config.DUPLICATION_RULES['time_window']:
-            if existing.sent_count >= Config.DUPLICATION_RULES['allowed_repeats']:
-                return True
-    return False
\ No newline at end of file
+    sent_count = 0
+    if pending_last and pending_last >= window_start:
+        sent_count += pending_count
+    if existing and existing.last_sent and existing.last_sent >= window_start:
+        sent_count += existing.sent_count or 0
+    return sent_count >= Config.DUPLICATION_RULES['allowed_repeats']